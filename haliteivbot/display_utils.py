@@ -12,8 +12,9 @@ def display_matrix(matrix):
 
 def display_dominance_map(map):
     plt.figure(figsize=(10, 10))
-    matrix = np.max(map, axis=0).reshape((21, 21)).round(2)
-    reshaped_map = map.reshape((4, 21, 21))
+    size = int(round(np.sqrt(map.shape[1])))
+    matrix = np.max(map, axis=0).reshape((size, size)).round(2)
+    reshaped_map = map.reshape((4, size, size))
     colors = ["Oranges", "Reds", "Greens", "Purples"]
     for i, color in enumerate(colors):
         sns.heatmap(
@@ -0,0 +1,54 @@
+import sys
+import time
+
+import numpy as np
+from kaggle_environments import make
+from kaggle_environments.envs.halite.helpers import Board
+
+from haliteivbot.rule_based.bot import HaliteBot, PARAMETERS
+
+# Measures how HaliteBot.step scales with the board area and the ship count.
+
+
+def timed_bot(bot, timings):
+    def agent(obs, config):
+        board = Board(obs, config)
+        start = time.perf_counter()
+        actions = bot.step(board, obs)
+        timings.append((time.perf_counter() - start, len(board.current_player.ships)))
+        return actions
+
+    return agent
+
+
+def benchmark(size, steps=100, seed=1):
+    env = make(
+        "halite",
+        configuration={"size": size, "randomSeed": seed, "episodeSteps": steps},
+        debug=True,
+    )
+    timings = []
+    env.run([timed_bot(HaliteBot(PARAMETERS), timings) for _ in range(4)])
+    step_times, ship_counts = np.array(timings).T
+    print(
+        "{:>4} {:>6} {:>10.2f} {:>10.2f} {:>10.1f} {:>10.3f}".format(
+            size,
+            size ** 2,
+            1000 * np.mean(step_times),
+            1000 * np.max(step_times),
+            np.mean(ship_counts),
+            1000 * np.sum(step_times) / max(np.sum(ship_counts), 1),
+        )
+    )
+
+
+if __name__ == "__main__":
+    steps = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    sizes = [int(size) for size in sys.argv[2:]] or [11, 15, 21, 31, 41]
+    print(
+        "{:>4} {:>6} {:>10} {:>10} {:>10} {:>10}".format(
+            "size", "cells", "mean [ms]", "max [ms]", "ships", "ms/ship"
+        )
+    )
+    for size in sizes:
+        benchmark(size, steps)
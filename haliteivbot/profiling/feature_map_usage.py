@@ -0,0 +1,31 @@
+import sys
+
+from kaggle_environments import make
+from kaggle_environments.envs.halite.helpers import Board
+
+from haliteivbot.rule_based.bot import HaliteBot, PARAMETERS
+
+# Reports in which share of the steps each feature map of the bot was actually computed.
+
+
+def measure_usage(steps=400, seed=1):
+    bots = [HaliteBot(PARAMETERS) for _ in range(4)]
+    env = make(
+        "halite",
+        configuration={"randomSeed": seed, "episodeSteps": steps},
+        debug=True,
+    )
+    env.run(
+        [
+            (lambda bot: lambda obs, config: bot.step(Board(obs, config), obs))(bot)
+            for bot in bots
+        ]
+    )
+    for player_id, bot in enumerate(bots):
+        print("Player {}:".format(player_id))
+        for name, usage in sorted(bot.feature_maps.get_usage().items()):
+            print("{:>30} {:>6.1%}".format(name, usage))
+
+
+if __name__ == "__main__":
+    measure_usage(*[int(arg) for arg in sys.argv[1:3]])
@@ -0,0 +1,42 @@
+import subprocess
+import sys
+import time
+
+# Measures the cold-start cost of the agent module in a fresh interpreter (like a new tournament process).
+
+
+def measure_import(module="haliteivbot.rule_based.bot", top=15):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import " + module],
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        check=True,
+    )
+    timings = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_time, cumulative_time, name = line[len("import time:") :].split("|")
+        timings.append((int(cumulative_time), int(self_time), name.strip()))
+    total = next(timing for timing in timings if timing[2] == module)[0]
+    print("Importing {} took {:.1f} ms".format(module, total / 1000))
+    print("Slowest imports (cumulative / self in ms):")
+    for cumulative_time, self_time, name in sorted(timings, reverse=True)[:top]:
+        print(
+            "{:>10.1f} {:>10.1f}  {}".format(
+                cumulative_time / 1000, self_time / 1000, name
+            )
+        )
+
+
+def measure_first_bot():
+    from haliteivbot.rule_based.bot import HaliteBot, PARAMETERS
+
+    start = time.time()
+    HaliteBot(PARAMETERS)
+    print("Creating the first bot took {:.1f} ms".format((time.time() - start) * 1000))
+
+
+if __name__ == "__main__":
+    measure_import(*sys.argv[1:2])
+    measure_first_bot()
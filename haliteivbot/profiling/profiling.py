@@ -69,7 +69,6 @@ if __name__ == "__main__":
         "map_blur_gamma": 0.9,
         "map_blur_sigma": 0.40223634381042517,
         "map_ultra_blur": 1.75,
-        "max_guarding_ships_per_target": 2,
         "max_halite_attack_shipyard": 0,
         "max_hunting_ships_per_direction": 1,
         "max_intrusion_count": 3,
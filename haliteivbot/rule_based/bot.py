@@ -80,7 +80,6 @@ PARAMETERS = {
     "map_blur_gamma": 0.9,
     "map_blur_sigma": 0.5549610080793232,
     "map_ultra_blur": 1.75,
-    "max_guarding_ships_per_target": 2,
     "max_halite_attack_shipyard": 0,
     "max_hunting_ships_per_direction": 2,
     "max_intrusion_count": 2,
@@ -203,7 +202,6 @@ EARLY_PARAMETERS = {
     "map_blur_gamma": 0.9,
     "map_blur_sigma": 0.3943145388324822,
     "map_ultra_blur": 1.75,
-    "max_guarding_ships_per_target": 2,
     "max_halite_attack_shipyard": 0,
     "max_hunting_ships_per_direction": 2,
     "max_intrusion_count": 3,
@@ -795,6 +793,7 @@ OPTIMAL_MINING_STEPS_TENSOR = [
 SHIPS_SHIPYARDS = [0, 8, 17, 23, 28, 33, 38, 46, 49]
 
 BOT = None
+GEOMETRY_BLOB = None  # filled in by build_submission.py
 
 
 class ShipType(Enum):
@@ -811,7 +810,19 @@ class ShipType(Enum):
 
 
 class HaliteBot(object):
-    def __init__(self, parameters):
+    blurred_halite_map = FeatureMap()
+    ultra_blurred_halite_map = FeatureMap()
+    min_ultra = FeatureMap()
+    max_ultra = FeatureMap()
+    dominance_fields = FeatureMap()
+    small_dominance_map = FeatureMap()
+    small_safety_map = FeatureMap()
+    medium_dominance_map = FeatureMap()
+    cargo_map = FeatureMap()
+    region_map = FeatureMap()
+    farming_point_counts = FeatureMap()
+
+    def __init__(self, parameters, optimal_mining_steps=None):
         self.late_parameters = parameters
         if EARLY_PARAMETERS is None:
             self.parameters = parameters
@@ -829,7 +840,6 @@ class HaliteBot(object):
         self.second_shipyard_ship = None
         self.first_guarding_ship = None
         self.next_shipyard_position = None
-        self.blurred_halite_map = None
         self.average_halite_per_cell = 0
         self.rank = 0
         self.first_shipyard_step = 0
@@ -850,7 +860,6 @@ class HaliteBot(object):
         self.friendly_neighbour_count = dict()
         self.shipyard_guards = list()
         self.spawn_cost = 500
-        self.intrusion_positions = {pos: dict() for pos in range(SIZE ** 2)}
         self.last_shipyard_count = 0
 
         self.enemies = list()
@@ -861,39 +870,130 @@ class HaliteBot(object):
         self.hunting_ships = list()
         self.guarding_ships = list()
 
-        if OPTIMAL_MINING_STEPS_TENSOR is None:
-            self.optimal_mining_steps = create_optimal_mining_steps_tensor(1, 1, 1)
+        # supplied tensors may use other weights, so they can't be rebuilt for larger boards
+        self.supplied_mining_steps = optimal_mining_steps is not None
+        if optimal_mining_steps is not None:
+            self.optimal_mining_steps = optimal_mining_steps
+        elif OPTIMAL_MINING_STEPS_TENSOR is None:
+            self.optimal_mining_steps = get_optimal_mining_steps_tensor(1, 1, 1)
         else:
             self.optimal_mining_steps = OPTIMAL_MINING_STEPS_TENSOR
 
-        create_navigation_lists(self.size)
-        self.distances = get_distance_matrix()
-        (
-            self.positions_in_reach_list,
-            self.positions_in_reach_indices,
-        ) = compute_positions_in_reach()
-        self.farthest_directions_indices = get_farthest_directions_matrix()
-        self.farthest_directions = get_farthest_directions_list()
-        (
-            self.tiny_radius_list,
-            self.small_radius_list,
-            self.medium_radius_list,
-        ) = create_radius_lists(
-            2,
-            self.parameters["dominance_map_small_radius"],
-            self.parameters["dominance_map_medium_radius"],
-        )
-        self.farming_radius_list = create_radius_list(
-            ceil(self.parameters["max_shipyard_distance"] / 2)
+        self.initialize_geometry(self.size)
+        self.feature_maps = FeatureMaps()
+        self.register_feature_maps()
+
+    def register_feature_maps(self):
+        register = self.feature_maps.register
+        register("blurred_halite_maps", self.compute_blurred_halite_maps)
+        register("blurred_halite_map", lambda maps: maps[0], ["blurred_halite_maps"])
+        register(
+            "ultra_blurred_halite_map", lambda maps: maps[1], ["blurred_halite_maps"]
+        )
+        register("min_ultra", np.min, ["ultra_blurred_halite_map"])
+        register("max_ultra", np.max, ["ultra_blurred_halite_map"])
+        register("dominance_fields", self.compute_dominance_fields)
+        register(
+            "small_dominance_map",
+            lambda fields: fields.get_dominance_map(
+                self.parameters["dominance_map_small_sigma"], 22
+            )[self.player_id],
+            ["dominance_fields"],
+        )
+        register(
+            "small_safety_map",
+            lambda fields: fields.get_safety_map(
+                self.parameters["dominance_map_small_sigma"], 20
+            ),
+            ["dominance_fields"],
+        )
+        register(
+            "medium_dominance_map",
+            lambda fields: fields.get_dominance_map(
+                self.parameters["dominance_map_medium_sigma"], 80
+            )[self.player_id],
+            ["dominance_fields"],
+        )
+        register(
+            "cargo_map",
+            lambda: get_cargo_map(
+                self.snapshot, self.player_id, self.parameters["cargo_map_halite_norm"]
+            ),
+        )
+        register(
+            "region_map", lambda fields: fields.get_regions(2.5), ["dominance_fields"]
+        )
+        register(
+            "farming_point_counts",
+            lambda positions: InBetweenCounts(positions, self.size),
+            ["real_farming_positions"],  # set by compute_regions
         )
 
+    def compute_blurred_halite_maps(self):
+        halite_sigmas = (
+            self.parameters["map_blur_sigma"],
+            self.parameters["map_ultra_blur"],
+        )
+        return get_blurred_halite_map(self.observation["halite"], halite_sigmas)
+
+    def compute_dominance_fields(self):
+        return DominanceFields(
+            self.snapshot,
+            self.player_id,
+            self.parameters["dominance_map_halite_clip"],
+            (
+                self.parameters["dominance_map_small_sigma"],
+                self.parameters["dominance_map_medium_sigma"],
+                2.5,
+            ),
+        )
+
+    def initialize_geometry(self, size):
+        if len(self.optimal_mining_steps) <= size:
+            if self.supplied_mining_steps:
+                raise ValueError(
+                    "The optimal mining steps tensor only covers boards up to {0}x{0}, "
+                    "a {1}x{1} board needs the shape {2}".format(
+                        len(self.optimal_mining_steps) - 1,
+                        size,
+                        get_mining_steps_tensor_shape(size),
+                    )
+                )
+            # the hardcoded tensor only covers boards up to 21x21
+            self.optimal_mining_steps = get_optimal_mining_steps_tensor(
+                1, 1, 1, get_mining_steps_tensor_shape(size)
+            )
+        self.size = size
+        small_radius = self.parameters["dominance_map_small_radius"]
+        medium_radius = self.parameters["dominance_map_medium_radius"]
+        farming_radius = ceil(self.parameters["max_shipyard_distance"] / 2)
+        self.geometry = geometry = get_geometry(
+            size, (2, small_radius, medium_radius, farming_radius)
+        )
+        self.distances = geometry.distances
+        self.positions_in_reach_list = geometry.positions_in_reach
+        self.positions_in_reach_indices = geometry.positions_in_reach_indices
+        self.farthest_directions_indices = geometry.farthest_directions_idx
+        self.tiny_radius_list = geometry.get_radius_list(2)
+        self.small_radius_list = geometry.get_radius_list(small_radius)
+        self.small_radius_array = geometry.get_radius_array(small_radius)
+        self.medium_radius_list = geometry.get_radius_list(medium_radius)
+        self.farming_radius_list = geometry.get_radius_list(farming_radius)
+        self.intrusion_positions = {pos: dict() for pos in range(size ** 2)}
+        self.step_masks = StepMasks(size)
+        self.optimal_mining_steps_array = np.asarray(self.optimal_mining_steps)
+
     def step(self, board: Board, obs):
         if self.me is None:
             self.player_id = board.current_player_id
             self.config = board.configuration
-            self.size = self.config.size
+            if self.config.size != self.size:
+                self.initialize_geometry(self.config.size)
+        self.geometry.install()  # other bots of this process might play on a different board size
 
         self.observation = obs
+        self.snapshot = BoardSnapshot(obs["players"])
+        self.feature_maps.reset()
         self.me = board.current_player
         self.opponents = board.opponents
         self.ships = self.me.ships
@@ -930,17 +1030,10 @@ class HaliteBot(object):
         )
         self.nb_cells_in_farming_radius = len(self.farming_radius_list[0])
 
-        self.blurred_halite_map = get_blurred_halite_map(
-            self.observation["halite"], self.parameters["map_blur_sigma"]
-        )
-        self.ultra_blurred_halite_map = get_blurred_halite_map(
-            self.observation["halite"], self.parameters["map_ultra_blur"]
-        )
-        self.min_ultra = np.min(self.ultra_blurred_halite_map)
-        self.max_ultra = np.max(self.ultra_blurred_halite_map)
         self.shipyard_positions = []
         for shipyard in self.me.shipyards:
             self.shipyard_positions.append(TO_INDEX[shipyard.position])
+        self.step_masks.set("shipyard_positions", self.shipyard_positions)
 
         players = [self.me] + self.opponents
         ranking = np.argsort(
@@ -1003,74 +1096,26 @@ class HaliteBot(object):
             if connections > 0:
                 self.nb_connected_shipyards += 1
 
-        self.enemy_distances = dict()
-        self.enemy_distances2 = dict()
-        for pos in range(SIZE ** 2):
-            min_distance = 20
-            min_distance2 = 20
-            for enemy_position in self.enemy_positions:
-                distance = get_distance(pos, enemy_position)
-                if distance < min_distance:
-                    min_distance2 = min_distance
-                    min_distance = distance
-                elif distance < min_distance2:
-                    min_distance2 = distance
-            self.enemy_distances[pos] = min_distance
-            self.enemy_distances2[pos] = min_distance2
+        self.enemy_distances, self.enemy_distances2, _ = get_distance_fields(
+            self.enemy_positions, 2 * (self.size // 2)
+        )
 
         self.farming_positions = []  # Das Gelbe vom Ei
         self.minor_farming_positions = []  # Das Weiße vom Ei
         self.real_farming_points = []
-        self.guarding_positions = []
+        self.guarding_positions = set()
         self.guarding_border = []
         if self.shipyard_count == 0:
             # There is no shipyard, but we still need to mine.
             self.shipyard_distances = [3] * self.size ** 2
         else:
             # Compute distances to the next shipyard:
-            self.shipyard_distances = []
-            for pos in range(0, SIZE ** 2):
-                min_distance = float("inf")
-                for (
-                    shipyard_position
-                ) in self.shipyard_positions:  # TODO: consider planned shipyards
-                    distance = get_distance(pos, shipyard_position)
-                    if distance < min_distance:
-                        min_distance = distance
-                self.shipyard_distances.append(min_distance)
-
-        if len(self.me.ships) > 0:
-            self.small_dominance_map = get_new_dominance_map(
-                players,
-                self.parameters["dominance_map_small_sigma"],
-                22,
-                self.parameters["dominance_map_halite_clip"],
-            )[self.player_id]
-            self.small_safety_map = get_dominance_map(
-                self.me,
-                self.opponents,
-                self.parameters["dominance_map_small_sigma"],
-                20,
-                self.parameters["dominance_map_halite_clip"],
-            )
-            self.medium_dominance_map = get_new_dominance_map(
-                players,
-                self.parameters["dominance_map_medium_sigma"],
-                80,
-                self.parameters["dominance_map_halite_clip"],
-            )[self.player_id]
-            self.cargo_map = get_cargo_map(
-                self.me.ships,
-                self.me.shipyards,
-                self.parameters["cargo_map_halite_norm"],
-            )
-            self.region_map = get_regions(
-                players, 2.5, self.parameters["dominance_map_halite_clip"]
-            )
+            self.shipyard_distances = get_distance_fields(self.shipyard_positions)[0]
 
         self.compute_regions(board)
 
         self.planned_moves.clear()
+        self.step_masks.set("planned_moves", [])
         self.spawn_limit_reached = self.reached_spawn_limit(board)
         self.harvest_threshold = self.calculate_harvest_threshold()
         self.positions_in_reach = []
@@ -1100,14 +1145,22 @@ class HaliteBot(object):
             else:
                 self.position_to_index[position] = [position_index]
 
-        self.danger_matrix = get_hunting_matrix(self.enemies)
+        enemy_ships = self.snapshot.ship_owners != self.player_id
+        self.danger_matrix, self.tiny_danger_matrix = get_danger_fields(
+            self.snapshot.ship_positions[enemy_ships],
+            self.snapshot.ship_halite[enemy_ships],
+        )
 
         self.ship_position_preferences = np.full(
             shape=(self.ship_count, nb_positions_in_reach + nb_shipyard_conversions),
             fill_value=-999999,
         )  # positions + convert "positions"
-        self.escape_matrix = np.zeros(
-            (len(self.me.ships), self.size ** 2), dtype=np.float
+        cell_scores = self.calculate_cell_scores(self.me.ships)
+        danger_scores, self.escape_matrix = get_danger_scores(
+            np.array([TO_INDEX[ship.position] for ship in self.me.ships], dtype=np.int),
+            np.array([ship.halite for ship in self.me.ships], dtype=np.int),
+            self.danger_matrix,
+            self.small_radius_array,
         )
         for ship_index, ship in enumerate(self.me.ships):
             if (
@@ -1119,34 +1172,8 @@ class HaliteBot(object):
                 ] = -self.parameters[
                     "convert_when_attacked_threshold"
                 ]  # TODO: check whether the ship really needs to convert
-            cargo = ship.halite
-            danger_scores = []
-            for position in self.positions_in_reach_list[ship.position]:
-                pos = TO_INDEX[position]
-                danger_score = 0
-                for pos2 in self.small_radius_list[TO_INDEX[position]]:
-                    cell_distance = get_distance(pos, pos2)
-                    if cell_distance == 0:
-                        discount = 1
-                    elif cell_distance == 1:
-                        discount = 0.75
-                    elif cell_distance == 2:
-                        discount = 0.45
-                    else:
-                        discount = 0.15
-                    if self.danger_matrix[pos2] < cargo:
-                        danger_score += 2 * discount
-                        self.escape_matrix[
-                            ship_index, self.positions_in_reach_indices[pos2]
-                        ] += 1
-                    elif self.danger_matrix[pos2] == cargo:
-                        danger_score += discount
-                        self.escape_matrix[
-                            ship_index, self.positions_in_reach_indices[pos2]
-                        ] += 0.5
-                danger_scores.append(danger_score)
-            min_danger = min(danger_scores)
-            max_danger = max(danger_scores)
+            min_danger = np.min(danger_scores[ship_index])
+            max_danger = np.max(danger_scores[ship_index])
 
             danger_score = (
                 self.parameters["cell_score_danger"]
@@ -1167,14 +1194,14 @@ class HaliteBot(object):
             ):
                 self.ship_position_preferences[
                     ship_index, self.position_to_index[position]
-                ] = self.calculate_cell_score(ship, board.cells[position])
+                ] = cell_scores[ship_index, pos_i]
                 if ship.halite > 0 and max_danger - min_danger > 1:
                     self.ship_position_preferences[
                         ship_index, self.position_to_index[position]
                     ] += int(
                         (
                             1
-                            - (danger_scores[pos_i] - min_danger)
+                            - (danger_scores[ship_index, pos_i] - min_danger)
                             / (max_danger - min_danger)
                         )
                         * danger_score
@@ -1223,7 +1250,7 @@ class HaliteBot(object):
                 for opponent in self.opponents
                 for ship in opponent.ships
                 if ship.halite <= self.hunting_halite_threshold
-                and TO_INDEX[ship.position] in self.farming_positions
+                and TO_INDEX[ship.position] in self.step_masks["farming_positions"]
             ]
         )
         logging.debug(
@@ -1238,7 +1265,7 @@ class HaliteBot(object):
 
         for enemy in self.enemies:
             position = TO_INDEX[enemy.position]
-            if position in self.farming_positions:
+            if position in self.step_masks["farming_positions"]:
                 if enemy.id not in self.intrusion_positions[position].keys():
                     self.intrusion_positions[position][enemy.id] = 1
                 else:
@@ -1264,11 +1291,15 @@ class HaliteBot(object):
                             ShipType.CONSTRUCTING in self.ship_types.values()
                             or (
                                 board.cells[
-                                    Point.from_index(self.next_shipyard_position, SIZE)
+                                    Point.from_index(
+                                        self.next_shipyard_position, self.size
+                                    )
                                 ].ship
                                 is not None
                                 and board.cells[
-                                    Point.from_index(self.next_shipyard_position, SIZE)
+                                    Point.from_index(
+                                        self.next_shipyard_position, self.size
+                                    )
                                 ].ship.player_id
                                 == self.player_id
                             )
@@ -1308,8 +1339,8 @@ class HaliteBot(object):
                         ):
                             points.append(
                                 (
-                                    Point.from_index(pos1, SIZE),
-                                    Point.from_index(pos2, SIZE),
+                                    Point.from_index(pos1, self.size),
+                                    Point.from_index(pos2, self.size),
                                 )
                             )
                 if (
@@ -1322,9 +1353,11 @@ class HaliteBot(object):
                     if self.pseudo_shipyard is not None:
                         points[0] = (points[0][0], points[0][1], self.pseudo_shipyard)
                     else:
-                        self.pseudo_shipyard = Point.from_index(
-                            self.plan_shipyard_position(True), SIZE
-                        )
+                        pseudo_shipyard_position = self.plan_shipyard_position(True)
+                        if pseudo_shipyard_position is not None:
+                            self.pseudo_shipyard = Point.from_index(
+                                pseudo_shipyard_position, self.size
+                            )
                         if self.pseudo_shipyard is not None:
                             points[0] = (
                                 points[0][0],
@@ -1334,7 +1367,7 @@ class HaliteBot(object):
         else:
             points = []
 
-        for pos in range(SIZE ** 2):
+        for pos in range(self.size ** 2):
             if (
                 self.shipyard_distances[pos]
                 > self.parameters["max_shipyard_distance"] + 4
@@ -1399,9 +1432,9 @@ class HaliteBot(object):
                         self.parameters["farming_start"] <= self.step_count
                         and in_guarding_range >= required_in_range
                     ):
-                        self.guarding_positions.append(pos)
+                        self.guarding_positions.add(pos)
                     if (
-                        pos not in self.shipyard_positions
+                        pos not in self.step_masks["shipyard_positions"]
                         and in_farming_range >= required_in_range
                     ):
                         self.farming_positions.append(pos)
@@ -1409,7 +1442,7 @@ class HaliteBot(object):
                         break
                     else:
                         if (
-                            pos not in self.shipyard_positions
+                            pos not in self.step_masks["shipyard_positions"]
                             and in_minor_farming_range >= required_in_range
                             and self.region_map[pos] == self.player_id
                         ):
@@ -1421,51 +1454,62 @@ class HaliteBot(object):
                     self.shipyard_distances[pos] <= self.parameters["guarding_radius"]
                     and pos not in self.guarding_positions
                 ):
-                    self.guarding_positions.append(pos)
+                    self.guarding_positions.add(pos)
                 if self.shipyard_distances[pos] == 2:
                     self.guarding_border.append(pos)
 
         for pos in self.farming_positions:
-            point = Point.from_index(pos, SIZE)
+            point = Point.from_index(pos, self.size)
             if board.cells[point].halite > 0:
                 self.real_farming_points.append(point)
+        self.feature_maps.set(
+            "real_farming_positions",
+            [TO_INDEX[point] for point in self.real_farming_points],
+        )
         if (
             self.step_count < self.parameters["farming_start"]
             or self.step_count > self.farming_end
         ):
             self.farming_positions = []
             self.minor_farming_positions = []
-        self.guarding_positions = set(self.guarding_positions)
+        self.step_masks.set("farming_positions", self.farming_positions)
+        self.step_masks.set("guarding_positions", self.guarding_positions)
         self.minor_farming_positions = [
             pos
             for pos in set(self.minor_farming_positions)
-            if pos not in self.farming_positions
+            if pos not in self.step_masks["farming_positions"]
         ]
+        self.step_masks.set("minor_farming_positions", self.minor_farming_positions)
         self.guarding_border = get_borders(set(self.guarding_border))
         self.guarding_border = [
             pos
             for pos in self.guarding_border
-            if pos not in self.farming_positions and pos not in self.shipyard_positions
+            if pos not in self.step_masks["farming_positions"]
+            and pos not in self.step_masks["shipyard_positions"]
         ]
 
+        border = set(self.guarding_border)
         changed = True
         while changed:
             changed = False
             for i in range(len(self.guarding_border)):
                 position = self.guarding_border[i]
-                neighbours = get_adjacent_positions(Point.from_index(position, SIZE))
+                neighbours = get_adjacent_positions(
+                    Point.from_index(position, self.size)
+                )
                 if (
                     sum(
                         [
                             1
                             for pos in neighbours
-                            if pos in self.guarding_border
-                            or pos in self.shipyard_positions
+                            if pos in border
+                            or pos in self.step_masks["shipyard_positions"]
                         ]
                     )
                     < 2
                 ):
                     self.guarding_border.remove(position)
+                    border.discard(position)
                     changed = True
                     break
 
@@ -1510,7 +1554,7 @@ class HaliteBot(object):
             early_second_shipyard = (
                 self.step_count <= self.parameters["early_second_shipyard"]
             )
-            for pos in range(SIZE ** 2):
+            for pos in range(self.size ** 2):
                 if (
                     self.parameters["min_shipyard_distance"]
                     <= get_distance(shipyard_pos, pos)
@@ -1524,10 +1568,10 @@ class HaliteBot(object):
                     )
                     >= self.parameters["min_enemy_shipyard_distance"]
                 ):
-                    point = Point.from_index(pos, SIZE)
+                    point = Point.from_index(pos, self.size)
                     half = 0.5 * get_vector(shipyard.position, point)
                     half = Point(round(half.x), round(half.y))
-                    midpoint = (shipyard.position + half) % SIZE
+                    midpoint = (shipyard.position + half) % self.size
                     if early_second_shipyard and self.observation["halite"][pos] <= 50:
                         possible_positions.append(
                             (
@@ -1559,8 +1603,8 @@ class HaliteBot(object):
                 for enemy_shipyard in player.shipyards
                 if self.map_presence_diff[player.id] < 12
             ]
-            for pos in range(SIZE ** 2):
-                point = Point.from_index(pos, SIZE)
+            for pos in range(self.size ** 2):
+                point = Point.from_index(pos, self.size)
                 if (
                     require_dominance
                     and self.medium_dominance_map[pos]
@@ -1584,7 +1628,7 @@ class HaliteBot(object):
                     or self.parameters["max_shipyard_distance"] < shipyard_distance
                 ):
                     continue
-                point = Point.from_index(pos, SIZE)
+                point = Point.from_index(pos, self.size)
                 good_distance = [
                     shipyard.position
                     for shipyard in self.me.shipyards
@@ -1627,7 +1671,7 @@ class HaliteBot(object):
                 self.next_shipyard_position = possible_positions[0][0]
                 logging.info(
                     "Planning to place the next shipyard at "
-                    + str(Point.from_index(self.next_shipyard_position, SIZE))
+                    + str(Point.from_index(self.next_shipyard_position, self.size))
                 )
             else:
                 return possible_positions[0][0]
@@ -1716,7 +1760,9 @@ class HaliteBot(object):
                         TO_INDEX[ship.position], self.next_shipyard_position
                     )
                 )
-                cell = board.cells[Point.from_index(self.next_shipyard_position, SIZE)]
+                cell = board.cells[
+                    Point.from_index(self.next_shipyard_position, self.size)
+                ]
                 if len(ships) > 0 and (
                     cell.ship is None or cell.ship.player_id != self.player_id
                 ):
@@ -1772,7 +1818,7 @@ class HaliteBot(object):
         for shipyard in shipyards:
             if self.halite < self.spawn_cost:  # save halite for the next shipyard
                 return
-            if shipyard.position in self.planned_moves:
+            if TO_INDEX[shipyard.position] in self.step_masks["planned_moves"]:
                 continue
             dominance = self.medium_dominance_map[TO_INDEX[shipyard.position]]
             if self.reached_spawn_limit(board):
@@ -1844,7 +1890,7 @@ class HaliteBot(object):
                 required_halite = target.halite - 1
                 intercepting_ship = None
                 min_halite = 9999
-                min_distance = 20
+                min_distance = 2 * (self.size // 2)
                 for ship in ships_for_interception:
                     if ship.id in self.ship_types.keys():
                         continue
@@ -1936,9 +1982,7 @@ class HaliteBot(object):
 
             ships.remove(ship)
 
-        row, col = scipy.optimize.linear_sum_assignment(
-            self.ship_position_preferences, maximize=True
-        )
+        row, col = linear_sum_assignment(self.ship_position_preferences, maximize=True)
         for ship_index, position_index in zip(row, col):
             ship = self.me.ships[ship_index]
             if position_index >= len(self.positions_in_reach):
@@ -1959,6 +2003,7 @@ class HaliteBot(object):
                         TO_INDEX[ship.position], TO_INDEX[target]
                     )
                 self.planned_moves.append(target)
+                self.step_masks.add("planned_moves", TO_INDEX[target])
 
     def assign_ship_targets(self, board: Board):
         # Mining assignment adapted from https://www.kaggle.com/solverworld/optimus-mine-agent
@@ -1967,7 +2012,6 @@ class HaliteBot(object):
 
         ship_targets = {}
         mining_positions = []
-        dropoff_positions = set()
 
         id_to_ship = {ship.id: ship for ship in self.mining_ships}
 
@@ -1979,17 +2023,6 @@ class HaliteBot(object):
             ):
                 mining_positions.append(position)
 
-        for shipyard in self.me.shipyards:
-            shipyard_pos = TO_INDEX[shipyard.position]
-            # Maybe only return to safe shipyards
-            # Add each shipyard once for each distance to a ship
-            for ship in self.mining_ships:
-                dropoff_positions.add(
-                    shipyard_pos
-                    + get_distance(TO_INDEX[ship.position], shipyard_pos) * 1000
-                )
-        dropoff_positions = list(dropoff_positions)
-
         self.mining_score_beta = (
             self.parameters["mining_score_beta"]
             if self.step_count >= self.parameters["mining_score_start_returning"]
@@ -1999,33 +2032,52 @@ class HaliteBot(object):
         if self.farming_end < self.step_count < self.parameters["end_start"]:
             self.mining_score_beta = self.parameters["mining_score_juicy_end"]
 
-        mining_scores = np.zeros(
-            (len(self.mining_ships), len(mining_positions) + len(dropoff_positions))
+        ship_indices = np.array(
+            [self.ship_to_index[ship] for ship in self.mining_ships], dtype=np.int
         )
-        for ship_index, ship in enumerate(self.mining_ships):
-            ship_pos = TO_INDEX[ship.position]
-            general_ship_index = self.ship_to_index[ship]
-            for position_index, position in enumerate(
-                mining_positions + dropoff_positions
-            ):
-                if position >= 1000:
-                    distance_to_shipyard = position // 1000
-                    position = position % 1000
-                    if distance_to_shipyard != get_distance(ship_pos, position):
-                        mining_scores[ship_index, position_index] = -999999
-                        continue
-
-                mining_scores[ship_index, position_index] = self.calculate_mining_score(
-                    general_ship_index,
-                    ship_pos,
-                    position,
-                    halite_map[position],
-                    self.blurred_halite_map[position],
-                    ship.halite,
-                )
+        ship_positions = np.array(
+            [TO_INDEX[ship.position] for ship in self.mining_ships], dtype=np.int
+        )
+        ship_halite = np.array(
+            [ship.halite for ship in self.mining_ships], dtype=np.int
+        )
+        mining_scores = self.calculate_mining_scores(
+            ship_indices,
+            ship_positions,
+            ship_halite,
+            np.array(mining_positions, dtype=np.int),
+        )
+        # Dropoffs: each shipyard takes one returning ship per distance, so there is one
+        # column per (shipyard, distance) pair. A ship can only use the columns of its
+        # distances to the shipyards and scores them with its return score. The
+        # distance 0 column of a shipyard with a ship on it is open to all ships.
+        target_positions = list(mining_positions)
+        if len(self.shipyard_positions) > 0:
+            # Maybe only return to safe shipyards
+            shipyard_positions = np.array(self.shipyard_positions, dtype=np.int)
+            return_scores = self.calculate_mining_scores(
+                ship_indices, ship_positions, ship_halite, shipyard_positions
+            )
+            dropoffs, dropoff_columns = np.unique(
+                np.arange(len(shipyard_positions)) * (self.size ** 2)
+                + self.distances[ship_positions[:, None], shipyard_positions],
+                return_inverse=True,
+            )
+            dropoff_scores = np.full((len(self.mining_ships), len(dropoffs)), -999999.0)
+            dropoff_scores[
+                np.repeat(np.arange(len(self.mining_ships)), len(shipyard_positions)),
+                dropoff_columns.ravel(),
+            ] = return_scores.ravel()
+            occupied = dropoffs % (self.size ** 2) == 0
+            dropoff_scores[:, occupied] = return_scores[
+                :, dropoffs[occupied] // (self.size ** 2)
+            ]
+            mining_scores = np.hstack([mining_scores, dropoff_scores])
+            target_positions.extend(
+                shipyard_positions[dropoffs // (self.size ** 2)].tolist()
+            )
 
-        row, col = scipy.optimize.linear_sum_assignment(mining_scores, maximize=True)
-        target_positions = mining_positions + dropoff_positions
+        row, col = linear_sum_assignment(mining_scores, maximize=True)
 
         assigned_scores = [mining_scores[r][c] for r, c in zip(row, col)]
         assigned_scores.sort()
@@ -2066,15 +2118,12 @@ class HaliteBot(object):
                 )
             ) and hunting_enabled:
                 continue
-            if target_positions[c] >= 1000:
-                ship_targets[self.mining_ships[r].id] = target_positions[c] % 1000
-            else:
-                ship_targets[self.mining_ships[r].id] = target_positions[c]
+            ship_targets[self.mining_ships[r].id] = target_positions[c]
 
         # Convert indexed positions to points
         for ship_id, target_pos in ship_targets.items():
             ship = id_to_ship[ship_id]
-            if target_pos in self.shipyard_positions:
+            if target_pos in self.step_masks["shipyard_positions"]:
                 self.returning_ships.append(ship)
                 self.mining_ships.remove(ship)
                 self.ship_types[ship_id] = ShipType.RETURNING
@@ -2100,43 +2149,44 @@ class HaliteBot(object):
 
         encoded_dirs = [1, 2, 4, 8]
         possible_enemy_targets = [
-            (dir, ship)
-            for ship in self.enemies
-            for dir in encoded_dirs
-            for _ in range(self.parameters["max_hunting_ships_per_direction"])
+            (dir, ship) for ship in self.enemies for dir in encoded_dirs
         ]
-        hunting_scores = np.zeros(
-            (
-                len(self.hunting_ships),
-                len(self.enemies)
-                * 4
-                * self.parameters["max_hunting_ships_per_direction"],
-            )
-        )
         hunting_ship_to_idx = {
             ship.id: idx for idx, ship in enumerate(self.hunting_ships)
         }
         self.interceptions = dict()
-        for ship_index, ship in enumerate(self.hunting_ships):
-            ship_pos = TO_INDEX[ship.position]
-            for enemy_index, (direction, enemy_ship) in enumerate(
-                possible_enemy_targets
-            ):
-                farthest_dirs = self.farthest_directions_indices[ship_pos][
-                    TO_INDEX[enemy_ship.position]
-                ]
-                if (
-                    farthest_dirs == direction
-                    or (farthest_dirs - direction) in encoded_dirs
-                ):
-                    hunting_scores[
-                        ship_index, enemy_index
-                    ] = self.calculate_hunting_score(ship, enemy_ship)
-                else:
-                    hunting_scores[ship_index, enemy_index] = -999999
+        # Score each (ship, enemy) pair once and expand it to the directions the ship
+        # can approach the enemy from. Each direction takes up to
+        # max_hunting_ships_per_direction ships.
+        compatible_directions = APPROACH_DIRECTIONS[
+            self.farthest_directions_indices[
+                np.array(
+                    [TO_INDEX[ship.position] for ship in self.hunting_ships],
+                    dtype=np.int,
+                )[:, None],
+                np.array(self.enemy_positions, dtype=np.int),
+            ]
+        ]  # ships x enemies x directions
+        pair_scores = np.full(compatible_directions.shape[:2], -999999.0)
+        for ship_index, enemy_index in zip(
+            *np.nonzero(np.any(compatible_directions, axis=2))
+        ):
+            pair_scores[ship_index, enemy_index] = self.calculate_hunting_score(
+                self.hunting_ships[ship_index], self.enemies[enemy_index]
+            )
+        hunting_scores = np.where(
+            compatible_directions, pair_scores[:, :, None], -999999
+        ).reshape(len(self.hunting_ships), len(possible_enemy_targets))
 
         assigned_hunting_scores = []
-        row, col = scipy.optimize.linear_sum_assignment(hunting_scores, maximize=True)
+        row, col = capacitated_linear_sum_assignment(
+            hunting_scores,
+            np.full(
+                len(possible_enemy_targets),
+                self.parameters["max_hunting_ships_per_direction"],
+            ),
+            maximize=True,
+        )
         for r, c in zip(row, col):
             self.hunting_targets[self.hunting_ships[r].id] = possible_enemy_targets[c][
                 1
@@ -2147,12 +2197,12 @@ class HaliteBot(object):
             guarding_targets = [
                 ship
                 for ship in self.enemies
-                if TO_INDEX[ship.position] in self.guarding_positions
+                if TO_INDEX[ship.position] in self.step_masks["guarding_positions"]
             ] + [
                 shipyard
                 for player in self.opponents
                 for shipyard in player.shipyards
-                if TO_INDEX[shipyard.position] in self.guarding_positions
+                if TO_INDEX[shipyard.position] in self.step_masks["guarding_positions"]
                 and len(self.me.shipyards) < 6
             ]
 
@@ -2176,7 +2226,7 @@ class HaliteBot(object):
                 [
                     1
                     for e in self.enemies
-                    if TO_INDEX[e.position] in self.guarding_positions
+                    if TO_INDEX[e.position] in self.step_masks["guarding_positions"]
                 ]
             )
             guarding_threshold_index = min(
@@ -2229,10 +2279,10 @@ class HaliteBot(object):
                     ship_pos = TO_INDEX[self.hunting_ships[r].position]
                     if hunting_scores[r, c] < guarding_threshold:
                         if (
-                            target_pos not in self.guarding_positions
+                            target_pos not in self.step_masks["guarding_positions"]
                             or get_distance(ship_pos, target_pos)
                             > self.parameters["guarding_aggression_radius"]
-                            or ship_pos in self.shipyard_positions
+                            or ship_pos in self.step_masks["shipyard_positions"]
                         ):
                             self.guarding_ships.append(self.hunting_ships[r])
                         else:
@@ -2254,11 +2304,7 @@ class HaliteBot(object):
                 assigned_defending_ships = []
                 if len(guarding_targets) > 0 and len(unassigned_defending_ships) > 0:
                     defending_targets = np.full(
-                        shape=(
-                            len(unassigned_defending_ships),
-                            len(guarding_targets)
-                            * self.parameters["max_guarding_ships_per_target"],
-                        ),
+                        shape=(len(unassigned_defending_ships), len(guarding_targets)),
                         fill_value=99999,
                         dtype=np.int,
                     )
@@ -2270,12 +2316,9 @@ class HaliteBot(object):
                                 distance
                                 <= self.parameters["guarding_aggression_radius"]
                             ):
-                                defending_targets[
-                                    ship_index, target_index * 2 : target_index * 2 + 1
-                                ] = distance
-                    row, col = scipy.optimize.linear_sum_assignment(
-                        defending_targets, maximize=False
-                    )
+                                defending_targets[ship_index, target_index] = distance
+                    # one ship per target
+                    row, col = linear_sum_assignment(defending_targets)
                     for r, c in zip(row, col):
                         if (
                             defending_targets[r, c]
@@ -2286,7 +2329,7 @@ class HaliteBot(object):
                         assigned_defending_ships.append(ship.id)
                         self.ship_types[ship.id] = ShipType.DEFENDING
                         self.hunting_targets[ship.id] = guarding_targets[
-                            c // self.parameters["max_guarding_ships_per_target"]
+                            c
                         ]  # hunt the target (ship is still in self.guarding_ships and self.hunting_ships)
 
                 for ship in self.guarding_ships:
@@ -2317,9 +2360,7 @@ class HaliteBot(object):
                         guarding_scores[
                             ship_index, border_index
                         ] = self.calculate_border_score(ship_pos, border_pos)
-                row, col = scipy.optimize.linear_sum_assignment(
-                    guarding_scores, maximize=False
-                )
+                row, col = linear_sum_assignment(guarding_scores)
                 for r, c in zip(row, col):
                     self.border_guards[
                         available_guarding_ships[r].id
@@ -2347,30 +2388,28 @@ class HaliteBot(object):
                 self.parameters["hunting_max_group_size"],
                 self.parameters["hunting_max_group_distance"],
             )
-            hunting_group_scores = np.zeros(
-                (len(hunting_groups), len(self.enemies) * 2)
+            hunting_group_scores = np.zeros((len(hunting_groups), len(self.enemies)))
+            # the best score of each ship for each enemy, independent of the direction
+            best_hunting_scores = np.clip(
+                np.where(np.any(compatible_directions, axis=2), pair_scores, -999999),
+                0,
+                999999,
             )
-            step = 4 * self.parameters["max_hunting_ships_per_direction"]
             for group_idx, group in enumerate(hunting_groups):
-                combined_hunting_scores = np.zeros((len(self.enemies) * 2,))
+                combined_hunting_scores = np.zeros((len(self.enemies),))
                 for ship in group:
-                    idx = hunting_ship_to_idx[ship.id]
-                    for i in range(len(combined_hunting_scores) // 2):
-                        combined_hunting_scores[i * 2 : (i + 1) * 2] += clip(
-                            np.max(hunting_scores[idx, i * step : (i + 1) * step]),
-                            0,
-                            999999,
-                        )
+                    combined_hunting_scores += best_hunting_scores[
+                        hunting_ship_to_idx[ship.id]
+                    ]
                 combined_hunting_scores /= len(group)
                 hunting_group_scores[group_idx] = combined_hunting_scores
-            row, col = scipy.optimize.linear_sum_assignment(
-                hunting_group_scores, maximize=True
+            # at most two groups hunt the same enemy
+            row, col = capacitated_linear_sum_assignment(
+                hunting_group_scores, np.full(len(self.enemies), 2), maximize=True
             )
             for r, c in zip(row, col):
                 for ship in hunting_groups[r]:
-                    self.hunting_targets[ship.id] = possible_enemy_targets[
-                        step * c // 2
-                    ][1]
+                    self.hunting_targets[ship.id] = self.enemies[c]
 
     def get_ship_type(self, ship: Ship, board: Board) -> ShipType:
         if ship.id in self.ship_types.keys():
@@ -2433,7 +2472,7 @@ class HaliteBot(object):
         self.prefer_moves(
             ship,
             navigate(ship.position, destination, self.size),
-            self.farthest_directions[ship_pos][destination_pos],
+            self.farthest_directions_indices[ship_pos][destination_pos],
             self.parameters["move_preference_return"],
             destination=destination,
         )
@@ -2447,12 +2486,12 @@ class HaliteBot(object):
         target = self.mining_targets[ship.id]
         ship_pos = TO_INDEX[ship.position]
         target_pos = TO_INDEX[target]
-        reduce_farming_penalty = target_pos not in self.farming_positions
+        reduce_farming_penalty = target_pos not in self.step_masks["farming_positions"]
         if target != ship.position:
             self.prefer_moves(
                 ship,
                 nav(ship_pos, target_pos),
-                self.farthest_directions[ship_pos][target_pos],
+                self.farthest_directions_indices[ship_pos][target_pos],
                 self.parameters["move_preference_base"],
                 reduce_farming_penalty=reduce_farming_penalty,
                 destination=target,
@@ -2487,7 +2526,7 @@ class HaliteBot(object):
             self.prefer_moves(
                 ship,
                 [],
-                [],
+                0,
                 self.parameters["move_preference_mining"],
                 reduce_farming_penalty=reduce_farming_penalty,
             )
@@ -2499,7 +2538,7 @@ class HaliteBot(object):
             self.ship_types[ship.id] == ShipType.DEFENDING
             and ship.id in self.hunting_targets.keys()
             and TO_INDEX[self.hunting_targets[ship.id].position]
-            in self.farming_positions
+            in self.step_masks["farming_positions"]
         )
         if self.step_count >= self.parameters["end_start"] and ship.halite == 0:
             enemy_shipyards = [
@@ -2523,7 +2562,9 @@ class HaliteBot(object):
                 self.prefer_moves(
                     ship,
                     navigate(ship_position, target.position, self.size),
-                    self.farthest_directions[ship_pos][TO_INDEX[target.position]],
+                    self.farthest_directions_indices[ship_pos][
+                        TO_INDEX[target.position]
+                    ],
                     self.parameters["move_preference_hunting"] * 2,
                     penalize_farming,
                     destination=target.position,
@@ -2557,7 +2598,7 @@ class HaliteBot(object):
                     self.prefer_moves(
                         ship,
                         self.interceptions[ship.id + target.id],
-                        [],
+                        0,
                         self.parameters["move_preference_hunting"],
                         penalize_farming,
                         destination=target.position,
@@ -2567,7 +2608,7 @@ class HaliteBot(object):
                         self.prefer_moves(
                             ship,
                             navigate(ship_position, target_position, self.size),
-                            self.farthest_directions[ship_pos][
+                            self.farthest_directions_indices[ship_pos][
                                 TO_INDEX[target_position]
                             ],
                             self.parameters["move_preference_hunting"],
@@ -2693,10 +2734,10 @@ class HaliteBot(object):
                 self.prefer_moves(
                     ship,
                     nav(ship_pos, target_position),
-                    self.farthest_directions[ship_pos][target_position],
+                    self.farthest_directions_indices[ship_pos][target_position],
                     move_preference,
                     False,
-                    destination=Point.from_index(target_position, SIZE),
+                    destination=Point.from_index(target_position, self.size),
                 )
             else:
                 self.change_position_score(
@@ -2716,10 +2757,10 @@ class HaliteBot(object):
             self.prefer_moves(
                 ship,
                 nav(ship_pos, target_position),
-                self.farthest_directions[ship_pos][target_position],
+                self.farthest_directions_indices[ship_pos][target_position],
                 self.parameters["move_preference_guarding"],
                 False,
-                destination=Point.from_index(target_position, SIZE),
+                destination=Point.from_index(target_position, self.size),
             )
 
     def handle_constructing_ship(self, ship: Ship):
@@ -2732,7 +2773,7 @@ class HaliteBot(object):
             else:
                 shipyard_point = self.planned_shipyards[0]
         else:
-            shipyard_point = Point.from_index(self.next_shipyard_position, SIZE)
+            shipyard_point = Point.from_index(self.next_shipyard_position, self.size)
         logging.debug(
             "Constructing ship "
             + str(ship.id)
@@ -2745,7 +2786,7 @@ class HaliteBot(object):
         self.prefer_moves(
             ship,
             navigate(ship.position, shipyard_point, self.size),
-            self.farthest_directions[TO_INDEX[ship.position]][
+            self.farthest_directions_indices[TO_INDEX[ship.position]][
                 self.next_shipyard_position
             ],
             self.parameters["move_preference_constructing"],
@@ -2764,11 +2805,13 @@ class HaliteBot(object):
             else:
                 shipyard_point = self.planned_shipyards[0]
         else:
-            shipyard_point = Point.from_index(self.next_shipyard_position, SIZE)
+            shipyard_point = Point.from_index(self.next_shipyard_position, self.size)
         self.prefer_moves(
             ship,
             navigate(ship.position, shipyard_point, self.size),
-            self.farthest_directions[TO_INDEX[ship.position]][TO_INDEX[shipyard_point]],
+            self.farthest_directions_indices[TO_INDEX[ship.position]][
+                TO_INDEX[shipyard_point]
+            ],
             self.parameters["move_preference_construction_guarding"],
             destination=shipyard_point,
         )
@@ -2779,7 +2822,7 @@ class HaliteBot(object):
             for shipyard_point in self.planned_shipyards:
                 self.guard_position(TO_INDEX[shipyard_point], shipyard_guards)
         for shipyard in self.me.shipyards:
-            if shipyard.position in self.planned_moves:
+            if TO_INDEX[shipyard.position] in self.step_masks["planned_moves"]:
                 continue
             shipyard_position = TO_INDEX[shipyard.position]
             dominance = self.medium_dominance_map[shipyard_position]
@@ -2890,8 +2933,8 @@ class HaliteBot(object):
         enemy_distance = self.enemy_distances[shipyard_position]
         enemy_distance2 = self.enemy_distances2[shipyard_position]
         dominance = self.medium_dominance_map[shipyard_position]
-        min_distance = 20
-        min_distance2 = 20
+        min_distance = 2 * (self.size // 2)
+        min_distance2 = 2 * (self.size // 2)
         guard = None
         guard2 = None
         for ship in [
@@ -2925,7 +2968,7 @@ class HaliteBot(object):
         if dominance < self.parameters["shipyard_abandon_dominance"]:
             logging.debug(
                 "Abandoning shipyard at position "
-                + str(Point.from_index(shipyard_position, SIZE))
+                + str(Point.from_index(shipyard_position, self.size))
             )
         elif enemy_distance - 1 <= min_distance and guard is not None:
             self.shipyard_guards.append(guard.id)
@@ -2941,7 +2984,7 @@ class HaliteBot(object):
         if dominance < self.parameters["shipyard_abandon_dominance"]:
             logging.debug(
                 "Abandoning shipyard at position "
-                + str(Point.from_index(shipyard_position, SIZE))
+                + str(Point.from_index(shipyard_position, self.size))
             )
         elif enemy_distance2 - 1 <= min_distance2 and guard2 is not None:
             self.shipyard_guards.append(guard2.id)
@@ -2956,7 +2999,11 @@ class HaliteBot(object):
         return min_distance
 
     def determine_vulnerable_enemies(self):
-        hunting_matrix = get_hunting_matrix(self.me.ships)
+        own_ships = self.snapshot.ship_owners == self.player_id
+        hunting_matrix, _ = get_danger_fields(
+            self.snapshot.ship_positions[own_ships],
+            self.snapshot.ship_halite[own_ships],
+        )
         self.vulnerable_ships = dict()
         self.escape_count = dict()
         self.vulnerable_positions = []
@@ -2989,10 +3036,7 @@ class HaliteBot(object):
         if self.halite + ship.halite < self.config.convert_cost:
             return False
         ship_pos = TO_INDEX[ship.position]
-        min_distance = 20
-        for enemy_pos in self.enemy_positions:
-            if get_distance(ship_pos, enemy_pos) < min_distance:
-                min_distance = get_distance(ship_pos, enemy_pos)
+        min_distance = self.enemy_distances[ship_pos]
         guards = [
             1
             for guard in self.me.ships
@@ -3049,14 +3093,14 @@ class HaliteBot(object):
                     <= get_distance(ship_pos, shipyard_position)
                     <= self.parameters["max_shipyard_distance"]
                 ):
-                    good_distance.append(Point.from_index(shipyard_position, SIZE))
+                    good_distance.append(Point.from_index(shipyard_position, self.size))
             if len(good_distance) == 0:
                 return False
             midpoints = []
             if self.max_shipyard_connections == 0:
                 half = 0.5 * get_vector(point, good_distance[0])
                 half = Point(round(half.x), round(half.y))
-                midpoints.append((point + half) % SIZE)
+                midpoints.append((point + half) % self.size)
             else:
                 for i in range(len(good_distance)):
                     for j in range(i + 1, len(good_distance)):
@@ -3090,6 +3134,190 @@ class HaliteBot(object):
             ]
         )
 
+    def calculate_mining_scores(
+        self, ship_indices, ship_positions, ship_halite, cell_positions
+    ):
+        """
+        Vectorized version of calculate_mining_score for all pairs of the given ships and cells.
+        :return: the mining scores (ships x cells)
+        """
+        parameters = self.parameters
+        halite_map = np.asarray(self.observation["halite"])
+        halite = halite_map[cell_positions]
+        blurred_halite = self.blurred_halite_map[cell_positions]
+        ship_halite = ship_halite[:, None]
+        distance_from_ship = self.distances[ship_positions[:, None], cell_positions]
+        distance_from_shipyard = np.broadcast_to(
+            np.asarray(self.shipyard_distances)[cell_positions],
+            distance_from_ship.shape,
+        )
+
+        mining_score_alpha = np.where(
+            self.step_count > 20 + distance_from_shipyard,
+            parameters["mining_score_alpha"],
+            0.5,
+        )
+        mining_score_beta = np.full(ship_halite.shape, self.mining_score_beta)
+        position_quality = (
+            self.ultra_blurred_halite_map[ship_positions[:, None]] / self.max_ultra
+        )
+        mining_score_alpha = np.where(
+            mining_score_alpha == parameters["mining_score_alpha"],
+            mining_score_alpha
+            * (
+                parameters["mining_score_alpha_min"]
+                + (1 - parameters["mining_score_alpha_min"]) * (1 - position_quality)
+            ),
+            mining_score_alpha,
+        )
+        if self.mining_score_beta == parameters["mining_score_beta"]:
+            mining_score_beta *= parameters["mining_score_beta_min"] + (
+                1 - parameters["mining_score_beta_min"]
+            ) * (1 - position_quality)
+
+        gamma_powers = parameters["map_blur_gamma"] ** distance_from_ship
+        halite_val = (1 - gamma_powers) * blurred_halite + gamma_powers * halite
+        enemy_cells = np.zeros(self.size ** 2, dtype=np.bool)
+        enemy_cells[self.enemy_positions] = True
+        enemy_cells = enemy_cells[cell_positions] & (distance_from_ship > 1)
+        halite_val = np.where(
+            enemy_cells,
+            halite_val * 0.75 ** (distance_from_ship - 1),
+            np.minimum(1.02 ** distance_from_ship * halite_val, 500),
+        )
+        farming_activated = (
+            parameters["farming_start"] <= self.step_count + distance_from_ship
+        ) & (self.step_count + distance_from_ship < self.farming_end)
+        distance_from_shipyard = np.minimum(
+            distance_from_shipyard, 2 * (self.size // 2)
+        )
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ratio = mining_score_beta * ship_halite / halite_val
+            ch = fix_near_integers(
+                np.log(ratio) * 2.5 + 5.5,
+                lambda r: math.log(r) * 2.5 + 5.5,
+                ratio,
+            )
+            ch = np.where(
+                ship_halite == 0,
+                0,
+                np.where(
+                    halite_val == 0,
+                    14,
+                    np.clip(np.trunc(np.nan_to_num(ch)), 0, 14).astype(np.int),
+                ),
+            )
+            harvest_ratio = self.harvest_threshold / halite_val
+            farming_steps = fix_near_integers(
+                np.log(harvest_ratio) / math.log(0.75),
+                lambda r: math.log(r, 0.75),
+                harvest_ratio,
+            )
+        farming_cells = self.step_masks.get_mask("farming_positions")[cell_positions]
+        minor_farming_cells = self.step_masks.get_mask("minor_farming_positions")[
+            cell_positions
+        ]
+
+        mining_steps = self.optimal_mining_steps_array[
+            distance_from_ship,
+            np.maximum(
+                np.round(mining_score_alpha * distance_from_shipyard).astype(np.int), 0
+            ),
+            ch,
+        ]
+        harvesting = (
+            farming_cells & (halite >= self.harvest_threshold) & farming_activated
+        )
+        mining_steps = np.where(
+            harvesting,
+            np.ceil(np.where(harvesting, farming_steps, 0)).astype(np.int),
+            mining_steps,
+        )
+        mining_steps = np.where(distance_from_shipyard == 0, 0, mining_steps)
+        if self.step_count >= parameters["end_start"]:
+            ending_steps = (
+                self.step_count
+                + distance_from_ship
+                + mining_steps
+                + distance_from_shipyard
+                + parameters["end_return_extra_moves"] // 2
+                - 398
+            )
+            mining_steps = np.where(
+                ending_steps > 0,
+                np.maximum(mining_steps - ending_steps, 0),
+                mining_steps,
+            )
+
+        dominance_clip = parameters["mining_score_dominance_clip"]
+        safety = (
+            parameters["mining_score_dominance_norm"]
+            * np.clip(
+                self.small_safety_map[cell_positions] + dominance_clip,
+                0,
+                1.5 * dominance_clip,
+            )
+            / (1.5 * dominance_clip)
+        )
+        if self.step_count < parameters["mining_score_start_returning"]:
+            safety /= 1.5
+            safety += parameters["mining_score_dominance_norm"] / 3
+        safety += 1 - parameters["mining_score_dominance_norm"] / 2
+
+        score = (
+            parameters["mining_score_gamma"] ** (distance_from_ship + mining_steps)
+            * (
+                mining_score_beta * ship_halite
+                + (1 - 0.75 ** mining_steps) * halite_val
+            )
+            * safety
+            / np.maximum(
+                distance_from_ship
+                + mining_steps
+                + mining_score_alpha * distance_from_shipyard,
+                1,
+            )
+        )
+        if self.step_count <= 11:
+            # We don't want to block the shipyard.
+            score[distance_from_shipyard == 0] *= 0.1
+        if np.any(farming_activated):
+            score[
+                farming_activated & (halite < self.harvest_threshold) & farming_cells
+            ] *= parameters["mining_score_farming_penalty"]
+            score[
+                farming_activated
+                & ~((halite < self.harvest_threshold) & farming_cells)
+                & (
+                    halite
+                    < parameters["minor_harvest_threshold"] * self.harvest_threshold
+                )
+                & minor_farming_cells
+            ] *= parameters["mining_score_minor_farming_penalty"]
+        if self.step_count <= 8 + self.first_shipyard_step:
+            score[distance_from_shipyard <= 3] *= 0.05
+        escape_score = (
+            1
+            - np.clip(
+                self.escape_matrix[ship_indices[:, None], cell_positions]
+                - self.mining_score_danger_tolerance,
+                0,
+                22,
+            )
+            / 22
+        )
+        score *= escape_score
+        tiny_danger = self.tiny_danger_matrix[cell_positions]
+        if self.step_count > parameters["greed_stop"]:
+            greedy = (escape_score > 0.85) & (tiny_danger <= ship_halite)
+            score[greedy] *= np.clip(tiny_danger / (ship_halite + 10), 0.25, 0.75)[
+                greedy
+            ]
+        # We are on the shipyard
+        score[(distance_from_shipyard == 0) & (distance_from_ship == 0)] = 0
+        return score
+
     def calculate_mining_score(
         self,
         ship_index,
@@ -3134,9 +3362,8 @@ class HaliteBot(object):
             <= (self.step_count + distance_from_ship)
             < self.farming_end
         )
-        if distance_from_shipyard > 20:
-            # There is no shipyard.
-            distance_from_shipyard = 20
+        if distance_from_shipyard > 2 * (self.size // 2):
+            distance_from_shipyard = 2 * (self.size // 2)
         if ship_halite == 0:
             ch = 0
         elif halite_val == 0:
@@ -3152,7 +3379,7 @@ class HaliteBot(object):
             if distance_from_ship == 0:
                 return 0  # We are on the shipyard
         elif (
-            cell_position in self.farming_positions
+            cell_position in self.step_masks["farming_positions"]
             and halite >= self.harvest_threshold
             and farming_activated
         ):  # halite not halite_val because we cannot be sure the cell halite regenerates
@@ -3208,13 +3435,13 @@ class HaliteBot(object):
         if farming_activated:
             if (
                 halite < self.harvest_threshold
-                and cell_position in self.farming_positions
+                and cell_position in self.step_masks["farming_positions"]
             ):  # halite not halite_val because we cannot be sure the cell halite regenerates
                 score *= self.parameters["mining_score_farming_penalty"]
             elif (
                 halite
                 < self.parameters["minor_harvest_threshold"] * self.harvest_threshold
-                and cell_position in self.minor_farming_positions
+                and cell_position in self.step_masks["minor_farming_positions"]
             ):
                 score *= self.parameters["mining_score_minor_farming_penalty"]
         if (
@@ -3235,13 +3462,11 @@ class HaliteBot(object):
         score *= escape_score
         if (
             escape_score > 0.85
-            and min(self.danger_matrix[self.tiny_radius_list[cell_position]])
-            <= ship_halite
+            and self.tiny_danger_matrix[cell_position] <= ship_halite
             and self.step_count > self.parameters["greed_stop"]
         ):
             score *= clip(
-                min(self.danger_matrix[self.tiny_radius_list[cell_position]])
-                / (ship_halite + 10),
+                self.tiny_danger_matrix[cell_position] / (ship_halite + 10),
                 0.25,
                 0.75,
             )
@@ -3284,7 +3509,7 @@ class HaliteBot(object):
             * halite_score
             * (
                 self.parameters["hunting_score_region"]
-                if enemy_pos in self.guarding_positions
+                if enemy_pos in self.step_masks["guarding_positions"]
                 else 1
             )
             * dominance_influence
@@ -3334,7 +3559,7 @@ class HaliteBot(object):
                 score *= self.parameters["hunting_score_intercept"] / 2
         if (
             len(self.real_farming_points) > 0
-            and enemy_pos not in self.farming_positions
+            and enemy_pos not in self.step_masks["farming_positions"]
         ):
             farming_positions_in_the_way = min(
                 [
@@ -3372,12 +3597,186 @@ class HaliteBot(object):
         else:
             return False, None, 99, None
 
+    def calculate_cell_scores(self, ships):
+        """
+        Vectorized version of calculate_cell_score for the cells in reach of the given ships.
+        :return: the cell scores (ships x 5) in the order of positions_in_reach_indices
+        """
+        parameters = self.parameters
+        snapshot = self.snapshot
+        nb_cells = self.size ** 2
+        ship_positions = np.array(
+            [TO_INDEX[ship.position] for ship in ships], dtype=np.int
+        )
+        ship_halite = np.array([ship.halite for ship in ships], dtype=np.int)[:, None]
+        cells = self.positions_in_reach_indices[ship_positions]  # ships x 5
+        neighbours = self.positions_in_reach_indices[cells][:, :, 1:]  # ships x 5 x 4
+        shipyard_distances = np.asarray(self.shipyard_distances)
+
+        # per-cell arrays
+        ship_owners = np.full(nb_cells, -1, dtype=np.int)
+        ship_owners[snapshot.ship_positions] = snapshot.ship_owners
+        cargo = np.zeros(nb_cells, dtype=np.int)
+        cargo[snapshot.ship_positions] = snapshot.ship_halite
+        enemies = (ship_owners >= 0) & (ship_owners != self.player_id)
+        shipyard_owners = np.full(nb_cells, -1, dtype=np.int)
+        shipyard_owners[snapshot.shipyard_positions] = snapshot.shipyard_owners
+        own_shipyards = shipyard_owners == self.player_id
+        farming = self.step_masks.get_mask("farming_positions")
+        halite = np.asarray(self.observation["halite"])
+        harvestable = farming & (0 < halite) & (halite < self.harvest_threshold)
+        if self.next_shipyard_position is None:
+            far_from_next_shipyard = np.ones(nb_cells, dtype=np.bool)
+        else:
+            far_from_next_shipyard = self.distances[:, self.next_shipyard_position] > 2
+        # enemies which are not repeated intruders and enemies we are greedy towards
+        tolerated = np.ones(nb_cells, dtype=np.bool)
+        greedy = np.zeros(nb_cells, dtype=np.bool)
+        for ship_id, position, owner in zip(
+            snapshot.ship_ids, snapshot.ship_positions, snapshot.ship_owners
+        ):
+            if owner == self.player_id:
+                continue
+            intrusions = self.intrusion_positions[position]
+            tolerated[position] = (
+                ship_id not in intrusions
+                or intrusions[ship_id] <= parameters["max_intrusion_count"]
+            )
+            greedy[position] = (
+                self.step_count > parameters["greed_stop"]
+                or self.map_presence_diff[owner] >= parameters["greed_min_map_diff"]
+            )
+        # the smallest cargo of a ship of the shipyard owner next to the shipyard
+        defender_cargo = np.where(
+            ship_owners[self.positions_in_reach_indices[:, 1:]]
+            == shipyard_owners[:, None],
+            cargo[self.positions_in_reach_indices[:, 1:]],
+            999999,
+        ).min(axis=1)
+
+        score = np.zeros(cells.shape)
+
+        # shipyards
+        yard_owners = shipyard_owners[cells]
+        enemy_yards = (yard_owners >= 0) & (yard_owners != self.player_id)
+        unprotected = (
+            (snapshot.player_halite[yard_owners] < self.config.spawn_cost)
+            & (ship_owners[cells] < 0)
+            & (ship_halite < 30)
+            & (defender_cargo[cells] > ship_halite)
+        )
+        attack = (
+            (ship_halite == 0)
+            & (
+                (self.rank == 0 and self.ship_advantage > 0)
+                | (self.step_count >= parameters["end_start"])
+                | farming[cells]
+            )
+        ) | (shipyard_distances[cells] <= 2)
+        yard_score = np.where(
+            unprotected,
+            300,
+            np.where(
+                ship_halite > parameters["max_halite_attack_shipyard"],
+                -(400 + ship_halite),
+                np.where(attack, 400, -300),
+            ),
+        )
+        score += np.where(enemy_yards, yard_score, 0)
+        if (
+            self.halite >= self.spawn_cost
+            and self.shipyard_count == 1
+            and not self.spawn_limit_reached
+        ):
+            blocking = own_shipyards[cells]
+            if self.step_count > 100:
+                blocking &= (
+                    self.medium_dominance_map[cells]
+                    >= parameters["spawn_min_dominance"]
+                )
+            score += np.where(blocking, parameters["move_preference_block_shipyard"], 0)
+
+        # enemy ships on the cells
+        enemy_cargo = cargo[cells]
+        swap = (
+            (~farming[cells] | ((shipyard_owners[cells] < 0) & tolerated[cells]))
+            & (shipyard_distances[cells] > 1)
+            & far_from_next_shipyard[cells]
+        )
+        ship_score = np.where(
+            enemy_cargo < ship_halite,
+            -(750 + ship_halite - 0.5 * enemy_cargo),
+            np.where(
+                enemy_cargo == ship_halite,
+                np.where(swap, -450, 0),
+                np.minimum(enemy_cargo * parameters["cell_score_enemy_halite"], 35),
+            ),
+        )
+        score += np.where(enemies[cells], ship_score, 0)
+
+        # enemy ships next to the cells
+        neighbour_discount = parameters["cell_score_neighbour_discount"]
+        neighbour_value = np.zeros(cells.shape)
+        threatened = np.zeros(cells.shape, dtype=np.bool)
+        for k in range(4):
+            neighbour = neighbours[:, :, k]
+            neighbour_cargo = cargo[neighbour]
+            is_enemy = enemies[neighbour]
+            threatened |= is_enemy & (neighbour_cargo < ship_halite)
+            equal = is_enemy & (neighbour_cargo == ship_halite) & ~own_shipyards[cells]
+            avoid = (
+                (
+                    ~farming[cells]
+                    & (shipyard_distances[cells] > 1)
+                    & (shipyard_distances[neighbour] > 1)
+                    & far_from_next_shipyard[cells]
+                )
+                | ((shipyard_owners[neighbour] < 0) & tolerated[neighbour])
+            ) & greedy[neighbour]
+            neighbour_value = np.where(
+                equal & avoid,
+                neighbour_value - 450 * neighbour_discount,
+                neighbour_value,
+            )
+            neighbour_value = np.where(
+                is_enemy & (neighbour_cargo >= ship_halite) & ~equal,
+                neighbour_value
+                + np.minimum(
+                    neighbour_cargo
+                    * parameters["cell_score_enemy_halite"]
+                    * neighbour_discount,
+                    25,
+                ),
+                neighbour_value,
+            )
+        # We really don't want to go to that cell unless it's necessary.
+        neighbour_value = np.where(
+            threatened,
+            -(750 + ship_halite) * (neighbour_discount + 0.15),
+            neighbour_value,
+        )
+        score += neighbour_value
+
+        score += parameters["cell_score_dominance"] * self.small_dominance_map[cells]
+        score += np.where(
+            harvestable[cells],
+            np.where(
+                cells == ship_positions[:, None],
+                parameters["cell_score_mine_farming"],
+                parameters["cell_score_farming"],
+            ),
+            0,
+        )
+        score *= 1 + parameters["cell_score_ship_halite"] * ship_halite
+        score[self.step_masks.get_mask("planned_moves")[cells]] = -1500
+        return score
+
     def calculate_cell_score(self, ship: Ship, cell: Cell) -> float:
         # trade = self.step_count >= self.parameters['trading_start']
         cell_pos = TO_INDEX[cell.position]
         trade = False
         score = 0
-        if cell.position in self.planned_moves:
+        if cell_pos in self.step_masks["planned_moves"]:
             score -= 1500
             return score
         if cell.shipyard is not None:
@@ -3407,7 +3806,7 @@ class HaliteBot(object):
                     and (
                         (self.rank == 0 and self.ship_advantage > 0)
                         or self.step_count >= self.parameters["end_start"]
-                        or cell_pos in self.farming_positions
+                        or cell_pos in self.step_masks["farming_positions"]
                     )
                     or self.shipyard_distances[cell_pos] <= 2
                 ):
@@ -3431,7 +3830,7 @@ class HaliteBot(object):
             elif cell.ship.halite == ship.halite:
                 if (
                     (
-                        cell_pos not in self.farming_positions
+                        cell_pos not in self.step_masks["farming_positions"]
                         or (
                             not trade
                             and cell.shipyard is None
@@ -3468,10 +3867,10 @@ class HaliteBot(object):
                     break
                 elif (
                     neighbour.ship.halite == ship.halite
-                    and cell_pos not in self.shipyard_positions
+                    and cell_pos not in self.step_masks["shipyard_positions"]
                 ):
                     if (
-                        cell_pos not in self.farming_positions
+                        cell_pos not in self.step_masks["farming_positions"]
                         and self.shipyard_distances[cell_pos] > 1
                         and self.shipyard_distances[TO_INDEX[neighbour.position]] > 1
                         and (
@@ -3512,7 +3911,7 @@ class HaliteBot(object):
             self.parameters["cell_score_dominance"] * self.small_dominance_map[cell_pos]
         )
         if (
-            cell_pos in self.farming_positions
+            cell_pos in self.step_masks["farming_positions"]
             and 0 < cell.halite < self.harvest_threshold
         ):
             if TO_INDEX[ship.position] == cell_pos:
@@ -3601,7 +4000,7 @@ class HaliteBot(object):
         for dir in directions:
             position = (ship.position + dir.to_point()) % self.size
             w = weight
-            if dir in longest_axis:
+            if DIRECTION_MASKS[dir] & longest_axis:
                 w += self.parameters["move_preference_longest_axis"]
             self.change_position_score(ship, position, weight)
         if (
@@ -3627,7 +4026,7 @@ class HaliteBot(object):
         if not penalize_farming:
             for cell in get_neighbours(ship.cell) + [ship.cell]:
                 if (
-                    TO_INDEX[cell.position] in self.farming_positions
+                    TO_INDEX[cell.position] in self.step_masks["farming_positions"]
                     and 0 < cell.halite < self.harvest_threshold
                 ):
                     self.change_position_score(
@@ -3636,7 +4035,7 @@ class HaliteBot(object):
         elif reduce_farming_penalty:
             for cell in get_neighbours(ship.cell) + [ship.cell]:
                 if (
-                    TO_INDEX[cell.position] in self.farming_positions
+                    TO_INDEX[cell.position] in self.step_masks["farming_positions"]
                     and 0 < cell.halite < self.harvest_threshold
                 ):
                     self.change_position_score(
@@ -3646,26 +4045,11 @@ class HaliteBot(object):
                     )
 
     def get_farming_positions_count_in_between(self, source, destination, axis):
-        count = 0
-        source_coordinate1 = source.x if axis == "x" else source.y
-        source_coordinate2 = source.y if axis == "x" else source.x
-        destination_coordinate = destination.y if axis == "x" else destination.x
-        distance = dist(source_coordinate2, destination_coordinate)
-        for farming_position in self.real_farming_points:
-            farming_coordinate1 = (
-                farming_position.x if axis == "x" else farming_position.y
-            )
-            if source_coordinate1 != farming_coordinate1:
-                continue
-            farming_coordinate2 = (
-                farming_position.y if axis == "x" else farming_position.x
+        return int(
+            self.farming_point_counts.query(
+                TO_INDEX[source], TO_INDEX[destination], axis
             )
-            if (
-                dist(source_coordinate2, farming_coordinate2) < distance
-                and dist(destination_coordinate, farming_coordinate2) < distance
-            ):
-                count += 1
-        return count
+        )
 
     def change_position_score(self, ship: Ship, position: Point, delta: float):
         self.ship_position_preferences[
@@ -3714,6 +4098,7 @@ class HaliteBot(object):
         assert self.halite >= self.config.spawn_cost
         shipyard.next_action = ShipyardAction.SPAWN
         self.planned_moves.append(shipyard.position)
+        self.step_masks.add("planned_moves", TO_INDEX[shipyard.position])
         self.halite -= self.config.spawn_cost
         self.ship_count += 1
         for cell in [shipyard.cell] + get_neighbours(shipyard.cell):
@@ -3770,8 +4155,11 @@ class HaliteBot(object):
 
 
 def agent(obs, config):
-    global BOT
+    global BOT, OPTIMAL_MINING_STEPS_TENSOR
     if BOT is None:
+        if GEOMETRY_BLOB is not None:
+            # the embedded tensor is the default one
+            _, OPTIMAL_MINING_STEPS_TENSOR = load_geometry_blob(GEOMETRY_BLOB)
         BOT = HaliteBot(PARAMETERS)
     board = Board(obs, config)
     logging.debug("Begin step " + str(board.step))
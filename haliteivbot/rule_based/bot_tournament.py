@@ -1,5 +1,6 @@
 import logging
 import traceback
+from math import ceil
 from multiprocessing import Process, Queue
 from random import randrange, sample
 
@@ -10,6 +11,7 @@ from kaggle_environments.envs.halite.helpers import Board
 from trueskill import Rating, rate
 
 from haliteivbot.rule_based.bot import HaliteBot
+from haliteivbot.rule_based.utils import get_geometry
 
 
 def wrap_bot(bot):
@@ -26,6 +28,16 @@ class Tournament(object):
                 self.bot_to_idx[bot] = index
             else:
                 self.bot_to_idx[bot["evo_id"]] = index
+                # build the shared geometry before the game processes are forked
+                get_geometry(
+                    21,
+                    (
+                        2,
+                        bot["dominance_map_small_radius"],
+                        bot["dominance_map_medium_radius"],
+                        ceil(bot["max_shipyard_distance"] / 2),
+                    ),
+                )
 
     def bot_to_index(self, bot):
         if isinstance(bot, str):
@@ -0,0 +1,62 @@
+import ast
+import os
+import sys
+
+from haliteivbot.rule_based import bot, utils
+
+# utils has to come first, the bot relies on its star import
+SOURCES = [utils.__file__, bot.__file__]
+
+
+def build_submission(output_path="submission.py"):
+    """
+    Concatenate utils.py and bot.py into a single-file agent and embed the precomputed
+    geometry and mining steps tensor, so the agent doesn't have to compute them on its first step.
+    """
+    halite_bot = bot.HaliteBot(bot.PARAMETERS)
+    geometry = utils.get_geometry(halite_bot.size)
+    blob = utils.dump_geometry_blob(geometry, halite_bot.optimal_mining_steps)
+
+    imports = []
+    bodies = []
+    for path in SOURCES:
+        with open(path) as file:
+            source = file.read()
+        lines = source.splitlines()
+        replacements = dict()
+        for node in ast.parse(source).body:
+            start, end = node.lineno - 1, node.end_lineno
+            if isinstance(node, (ast.Import, ast.ImportFrom)):
+                statement = "\n".join(lines[start:end])
+                if "haliteivbot" not in statement and statement not in imports:
+                    imports.append(statement)
+                replacements[start] = (end, [])
+            elif isinstance(node, ast.Assign) and len(node.targets) == 1:
+                name = getattr(node.targets[0], "id", None)
+                if name == "GEOMETRY_BLOB":
+                    replacements[start] = (end, ["GEOMETRY_BLOB = " + repr(blob)])
+                elif name == "OPTIMAL_MINING_STEPS_TENSOR":
+                    # the tensor is part of the blob
+                    replacements[start] = (end, ["OPTIMAL_MINING_STEPS_TENSOR = None"])
+        body = []
+        index = 0
+        while index < len(lines):
+            if index in replacements:
+                index, replacement = replacements[index]
+                body.extend(replacement)
+            else:
+                body.append(lines[index])
+                index += 1
+        bodies.append("\n".join(body).strip())
+
+    with open(output_path, "w") as file:
+        file.write("\n".join(imports) + "\n\n\n" + "\n\n\n".join(bodies) + "\n")
+    print(
+        "Wrote {} ({} kB, geometry blob {} kB)".format(
+            output_path, os.path.getsize(output_path) // 1024, len(blob) // 1024
+        )
+    )
+
+
+if __name__ == "__main__":
+    build_submission(*sys.argv[1:])
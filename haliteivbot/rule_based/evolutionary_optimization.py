@@ -79,7 +79,6 @@ hyperparameters = {
     "map_blur_gamma": ("float", (0.7, 0.99)),
     "map_blur_sigma": ("float", (0.1, 0.8)),
     "map_ultra_blur": ("float", (1, 2)),
-    "max_guarding_ships_per_target": ("int", (2, 4)),
     "max_halite_attack_shipyard": ("int", (0, 0)),
     "max_hunting_ships_per_direction": ("int", (1, 2)),
     "max_ship_advantage": ("int", (-1, 25)),
@@ -177,7 +176,6 @@ frozen_early_parameters = frozen_parameters + [
     "hunting_max_group_size",
     "hunting_proportion_after_farming",
     "map_ultra_blur",
-    "max_guarding_ships_per_target",
     "min_enemy_shipyard_distance",
     "mining_score_juicy_end",
     "shipyard_min_population",
@@ -251,7 +249,6 @@ first_genome = {
     "map_blur_gamma": 0.9,
     "map_blur_sigma": 0.3943145388324822,
     "map_ultra_blur": 1.75,
-    "max_guarding_ships_per_target": 2,
     "max_halite_attack_shipyard": 0,
     "max_hunting_ships_per_direction": 2,
     "max_intrusion_count": 3,
@@ -373,7 +370,6 @@ second_genome = {
     "map_blur_gamma": 0.9,
     "map_blur_sigma": 0.40223634381042517,
     "map_ultra_blur": 1.75,
-    "max_guarding_ships_per_target": 2,
     "max_halite_attack_shipyard": 0,
     "max_hunting_ships_per_direction": 2,
     "max_intrusion_count": 3,
@@ -1,4 +1,4 @@
-from haliteivbot.rule_based.utils import create_optimal_mining_steps_tensor
+from haliteivbot.rule_based.utils import get_optimal_mining_steps_tensor
 
 
 def sort_dictionary(dictionary):
@@ -12,5 +12,5 @@ def sort_dictionary(dictionary):
 
 
 def generate_optimal_mining_steps_tensor(parameters):
-    print(create_optimal_mining_steps_tensor(parameters['mining_score_alpha'], parameters['mining_score_beta'],
-                                             parameters['mining_score_gamma']))
+    return get_optimal_mining_steps_tensor(parameters['mining_score_alpha'], parameters['mining_score_beta'],
+                                           parameters['mining_score_gamma'])
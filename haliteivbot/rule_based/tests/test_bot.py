@@ -0,0 +1,88 @@
+import unittest
+
+import numpy as np
+from kaggle_environments import make
+from kaggle_environments.envs.halite.helpers import Board
+
+from haliteivbot.rule_based.bot import HaliteBot, PARAMETERS
+from haliteivbot.rule_based.utils import TO_INDEX
+
+
+class TestBot(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.bot = HaliteBot(PARAMETERS)
+        boards = []
+
+        def agent(obs, config):
+            boards.append(Board(obs, config))
+            return cls.bot.step(boards[-1], obs)
+
+        bots = [HaliteBot(PARAMETERS) for _ in range(3)]
+        env = make(
+            "halite", configuration={"randomSeed": 3, "episodeSteps": 40}, debug=True
+        )
+        env.run(
+            [agent]
+            + [
+                (lambda bot: lambda obs, config: bot.step(Board(obs, config), obs))(bot)
+                for bot in bots
+            ]
+        )
+        cls.board = boards[-1]
+
+    def test_supplied_mining_steps_size(self):
+        """
+        Test that a supplied mining steps tensor which is too small for the board isn't replaced
+        """
+        bot = HaliteBot(PARAMETERS, self.bot.optimal_mining_steps)
+        self.assertRaises(ValueError, bot.initialize_geometry, 31)
+        self.assertEqual(bot.size, 21)
+
+    def test_mining_scores(self):
+        """
+        Test that the vectorized mining scores match calculate_mining_score
+        """
+        bot = self.bot
+        ships = bot.mining_ships
+        self.assertGreater(len(ships), 0)
+        ship_indices = np.array([bot.ship_to_index[ship] for ship in ships])
+        ship_positions = np.array([TO_INDEX[ship.position] for ship in ships])
+        ship_halite = np.array([ship.halite for ship in ships])
+        cell_positions = np.arange(bot.size ** 2)
+        halite = bot.observation["halite"]
+        mining_scores = bot.calculate_mining_scores(
+            ship_indices, ship_positions, ship_halite, cell_positions
+        )
+        for i in range(len(ships)):
+            for cell in cell_positions:
+                self.assertEqual(
+                    mining_scores[i, cell],
+                    bot.calculate_mining_score(
+                        ship_indices[i],
+                        ship_positions[i],
+                        cell,
+                        halite[cell],
+                        bot.blurred_halite_map[cell],
+                        ship_halite[i],
+                    ),
+                )
+
+    def test_cell_scores(self):
+        """
+        Test that the vectorized cell scores match calculate_cell_score
+        """
+        bot = self.bot
+        ships = bot.me.ships
+        self.assertGreater(len(bot.planned_moves), 0)
+        cell_scores = bot.calculate_cell_scores(ships)
+        for i, ship in enumerate(ships):
+            for j, position in enumerate(bot.positions_in_reach_list[ship.position]):
+                self.assertEqual(
+                    cell_scores[i, j],
+                    bot.calculate_cell_score(ship, self.board.cells[position]),
+                )
+
+
+if __name__ == "__main__":
+    unittest.main()
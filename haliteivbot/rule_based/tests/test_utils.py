@@ -1,5 +1,8 @@
+import os
+import tempfile
 import unittest
 
+from haliteivbot.rule_based import utils
 from haliteivbot.rule_based.utils import *
 
 
@@ -21,6 +24,282 @@ class TestUtils(unittest.TestCase):
         target2 = 39
         directions2 = nav(source2, target2)
         self.assertEqual(directions2, [ShipAction.WEST, ShipAction.SOUTH])  # wrap-around
+        self.assertEqual(get_direction_to_neighbour(source1, target1), ShipAction.EAST)
+        self.assertEqual(get_farthest_directions(source2, target2), [ShipAction.WEST])
+
+    def test_optimal_mining_steps_tensor(self):
+        """
+        Test that the tensor contains the integer amount of mining steps with the best score
+        """
+        alpha, beta, gamma = 0.9, 0.95, 0.99
+        tensor = create_optimal_mining_steps_tensor(alpha, beta, gamma)
+        self.assertEqual(np.array(tensor).shape, MINING_STEPS_TENSOR_SHAPE)
+
+        def score(n1, n2, m, H, C):
+            return gamma ** (n1 + m) * (beta * C + (1 - 0.75 ** m) * 1.02 ** (n1 + m) * H) / (n1 + alpha * n2 + m)
+
+        for n1, n2, ch in [(0, 0, 0), (3, 7, 2), (12, 4, 5), (21, 21, 14)]:
+            CHratio = 0 if ch == 0 else math.exp((ch - 5) / 2.5)
+            best = max(range(1, 16), key=lambda m: score(n1, n2, m, 500, CHratio * 500))
+            self.assertEqual(tensor[n1][n2][ch], best)
+
+    def test_mining_steps_tensor_cache(self):
+        """
+        Test that mining steps tensors are cached on disk and in memory
+        """
+        shape = (3, 2, 15)
+        self.addCleanup(setattr, utils, "MINING_STEPS_CACHE_DIR", utils.MINING_STEPS_CACHE_DIR)
+        with tempfile.TemporaryDirectory() as cache_dir:
+            utils.MINING_STEPS_CACHE_DIR = cache_dir
+            utils._MINING_STEPS_TENSORS.clear()
+            tensor = get_optimal_mining_steps_tensor(1, 1, 1, shape)
+            self.assertEqual(tensor, create_optimal_mining_steps_tensor(1, 1, 1, shape))
+            self.assertEqual(len(os.listdir(cache_dir)), 1)
+            self.assertIs(get_optimal_mining_steps_tensor(1, 1, 1, shape), tensor)
+
+            utils._MINING_STEPS_TENSORS.clear()  # force a reload from disk
+            self.assertEqual(get_optimal_mining_steps_tensor(1, 1, 1, shape), tensor)
+            utils._MINING_STEPS_TENSORS.clear()
+
+    def test_shared_geometry(self):
+        """
+        Test that the geometry is built once and shared read-only
+        """
+        geometry = get_geometry(21, (2, 3))
+        self.assertIs(get_geometry(21, (3,)), geometry)
+        self.assertIs(geometry.get_radius_list(3), get_geometry(21, (3,)).get_radius_list(3))
+        self.assertEqual(len(geometry.get_radius_list(2)[0]), 13)
+        self.assertEqual(geometry.distances[0][39], 4)
+        with self.assertRaises(ValueError):
+            geometry.distances[0][39] = 0
+
+    def test_geometry_blob(self):
+        """
+        Test that a geometry blob restores the same tables
+        """
+        self.addCleanup(utils._GEOMETRIES.clear)
+        geometry = get_geometry(21, (2,))
+        tensor = create_optimal_mining_steps_tensor(1, 1, 1)
+        blob = dump_geometry_blob(geometry, tensor)
+        utils._GEOMETRIES.clear()
+        loaded_geometry, loaded_tensor = load_geometry_blob(blob)
+        self.assertIs(get_geometry(21), loaded_geometry)
+        self.assertEqual(loaded_tensor, tensor)
+        self.assertEqual(loaded_geometry.get_radius_list(2), geometry.get_radius_list(2))
+        self.assertEqual(loaded_geometry.positions_in_reach, geometry.positions_in_reach)
+        for name in GEOMETRY_TABLES:
+            np.testing.assert_array_equal(getattr(loaded_geometry, name), getattr(geometry, name))
+            self.assertEqual(getattr(loaded_geometry, name).dtype, getattr(geometry, name).dtype)
+
+    def test_board_sizes(self):
+        """
+        Test that geometries of different board sizes can be used side by side
+        """
+        self.addCleanup(get_geometry, 21)
+        geometry = get_geometry(11, (2,))
+        self.assertEqual(utils.SIZE, 11)
+        self.assertEqual(TO_INDEX[Point(10, 0)], 120)
+        self.assertEqual(get_distance(0, 120), 2)
+        self.assertEqual(nav(0, 120), [ShipAction.WEST, ShipAction.NORTH])  # wrap-around
+        self.assertEqual(len(geometry.get_radius_list(2)), 121)
+        self.assertEqual(get_blurred_halite_map([1] * 121, 1).shape, (121,))
+        get_geometry(21)
+        self.assertEqual(TO_INDEX[Point(20, 0)], 440)
+        for key in [Point(21, 0), 5, "a1", (1, 2, 3), (None, 1)]:
+            self.assertRaises(KeyError, lambda: TO_INDEX[key])
+        self.assertEqual(get_mining_steps_tensor_shape(21), MINING_STEPS_TENSOR_SHAPE)
+
+    def test_blur(self):
+        """
+        Test that the FFT blur is the same as a wrapped gaussian filter
+        """
+        from scipy.ndimage import gaussian_filter
+
+        maps = np.random.RandomState(0).rand(3, 21 ** 2) * 500
+        sigmas = (0.4, 1.75, 6)  # the kernel of the last sigma is wider than the board
+        blurred_maps = blur(maps, sigmas, 21)
+        self.assertEqual(blurred_maps.shape, (3, 3, 21 ** 2))
+        for sigma, blurred in zip(sigmas, blurred_maps):
+            for map, blurred_map in zip(maps, blurred):
+                expected = gaussian_filter(map.reshape((21, 21)), sigma, mode="wrap").reshape((-1,))
+                np.testing.assert_allclose(blurred_map, expected, atol=1e-9)
+        np.testing.assert_allclose(blur(maps[0], sigmas[0], 21), blurred_maps[0, 0])
+
+    def test_board_snapshot(self):
+        """
+        Test that the snapshot contains all ships and shipyards and that the hunting matrix uses it correctly
+        """
+        get_geometry(21)
+        players = [
+            [5000, {"0-1": 22}, {"1-1": [22, 0], "2-1": [10, 30]}],
+            [4000, {}, {"3-1": [11, 10]}],
+        ]
+        snapshot = BoardSnapshot(players)
+        self.assertEqual(snapshot.player_count, 2)
+        self.assertEqual(snapshot.ship_positions.tolist(), [22, 10, 11])
+        self.assertEqual(snapshot.ship_halite.tolist(), [0, 30, 10])
+        self.assertEqual(snapshot.ship_owners.tolist(), [0, 0, 1])
+        self.assertEqual(snapshot.shipyard_positions.tolist(), [22])
+        self.assertEqual(snapshot.shipyard_owners.tolist(), [0])
+
+        hunting_matrix = get_hunting_matrix(snapshot.ship_positions, snapshot.ship_halite)
+        self.assertEqual(hunting_matrix[10], 10)  # both ships can reach 10 and 11
+        self.assertEqual(hunting_matrix[9], 30)
+        self.assertEqual(hunting_matrix[12], 10)
+        self.assertEqual(hunting_matrix[22], 0)
+        self.assertEqual(hunting_matrix[100], 99999)
+
+    def test_distance_fields(self):
+        """
+        Test the nearest and second nearest distances against a brute force computation
+        """
+        get_geometry(21)
+        positions = [5, 100, 101, 300, 5]
+        nearest, second_nearest, nearest_indices = get_distance_fields(positions, 7)
+        for cell in range(21 ** 2):
+            distances = sorted(get_distance(cell, position) for position in positions)
+            self.assertEqual(nearest[cell], min(distances[0], 7))
+            self.assertEqual(second_nearest[cell], min(distances[1], 7))
+            self.assertEqual(get_distance(cell, positions[nearest_indices[cell]]), distances[0])
+        nearest, second_nearest, nearest_indices = get_distance_fields([])
+        self.assertEqual(set(nearest), {20})
+        self.assertEqual(set(nearest_indices), {-1})
+
+    def test_danger_scores(self):
+        """
+        Test the batched danger scores and escape matrix against a loop over all ships
+        """
+        geometry = get_geometry(21, (3,))
+        random_state = np.random.RandomState(1)
+        danger_matrix = random_state.choice([0, 10, 50, 99999], 21 ** 2)
+        ship_positions = np.array([0, 44, 200, 440])
+        ship_halite = np.array([0, 10, 30, 70])
+        danger_scores, escape_matrix = get_danger_scores(
+            ship_positions, ship_halite, danger_matrix, geometry.get_radius_array(3)
+        )
+        self.assertEqual(escape_matrix.shape, (4, 21 ** 2))
+        for ship_index, (ship_position, cargo) in enumerate(zip(ship_positions, ship_halite)):
+            expected_escape = np.zeros((21 ** 2,))
+            for reach_index, position in enumerate(geometry.positions_in_reach_indices[ship_position]):
+                danger_score = 0
+                for pos2 in geometry.get_radius_list(3)[position]:
+                    discount = [1, 0.75, 0.45, 0.15][min(get_distance(position, pos2), 3)]
+                    if danger_matrix[pos2] < cargo:
+                        danger_score += 2 * discount
+                        expected_escape[geometry.positions_in_reach_indices[pos2]] += 1
+                    elif danger_matrix[pos2] == cargo:
+                        danger_score += discount
+                        expected_escape[geometry.positions_in_reach_indices[pos2]] += 0.5
+                self.assertEqual(danger_scores[ship_index, reach_index], danger_score)
+            np.testing.assert_array_equal(escape_matrix[ship_index], expected_escape)
+
+    def test_danger_fields(self):
+        """
+        Test that the min filters match the minimum over the radius lists
+        """
+        geometry = get_geometry(21, (2,))
+        random_state = np.random.RandomState(2)
+        ship_positions = random_state.choice(21 ** 2, 30, replace=False)
+        ship_halite = random_state.randint(0, 500, 30)
+        hunting_matrix, tiny_danger_matrix = get_danger_fields(ship_positions, ship_halite)
+        cargo_map = np.full((21 ** 2,), 99999)
+        cargo_map[ship_positions] = ship_halite
+        for cell in range(21 ** 2):
+            self.assertEqual(hunting_matrix[cell], min(cargo_map[geometry.positions_in_reach_indices[cell]]))
+            self.assertEqual(tiny_danger_matrix[cell], min(hunting_matrix[geometry.get_radius_list(2)[cell]]))
+
+    def test_dominance_fields(self):
+        """
+        Test the leave-one-out maxima of the dominance maps against a loop over the players
+        """
+        get_geometry(21)
+        players = [
+            [5000, {"0-1": 22}, {"1-1": [22, 0], "2-1": [10, 30]}],
+            [4000, {"0-2": 200}, {"3-1": [11, 10]}],
+            [3000, {}, {"4-1": [300, 100]}],
+            [3000, {}, {}],
+        ]
+        fields = DominanceFields(BoardSnapshot(players), 1, 70, (1.5, 2.5))
+        blurred_layers = fields.blurred_layers[0, :4] * 22
+        dominance_map = fields.get_dominance_map(1.5, 22)
+        for i in range(4):
+            others = [j for j in range(4) if j != i]
+            np.testing.assert_array_equal(dominance_map[i], blurred_layers[i] - np.max(blurred_layers[others], axis=0))
+        self.assertIs(fields.get_dominance_map(1.5, 22), dominance_map)
+        regions = fields.get_regions(2.5)
+        self.assertEqual(regions[200], 1)
+        self.assertEqual(regions[22], 0)
+        safety_map = fields.get_safety_map(1.5, 20)
+        self.assertGreater(safety_map[200], 0)
+        self.assertLess(safety_map[22], 0)
+
+    def test_feature_maps(self):
+        """
+        Test that feature maps are computed lazily, once per step and after their dependencies
+        """
+        calls = []
+        feature_maps = FeatureMaps()
+        feature_maps.register("base", lambda: calls.append("base") or 2)
+        feature_maps.register("double", lambda base: calls.append("double") or 2 * base, ["base"])
+        feature_maps.register("unused", lambda: calls.append("unused"))
+        feature_maps.reset()
+        self.assertEqual(feature_maps["double"], 4)
+        self.assertEqual(feature_maps["double"], 4)
+        self.assertEqual(calls, ["base", "double"])
+        feature_maps.reset()
+        self.assertEqual(feature_maps["base"], 2)
+        self.assertEqual(feature_maps.get_usage(), {"base": 1, "double": 0.5, "unused": 0})
+        feature_maps.register("cycle", lambda cycle: cycle, ["cycle"])
+        self.assertRaises(ValueError, lambda: feature_maps["cycle"])
+        feature_maps.register("scaled", lambda given: 3 * given, ["given"])
+        self.assertRaises(KeyError, lambda: feature_maps["scaled"])
+        feature_maps.set("given", 1)
+        self.assertEqual(feature_maps["scaled"], 3)
+        feature_maps.set("given", 2)
+        self.assertEqual(feature_maps["scaled"], 6)
+
+    def test_in_between_counts(self):
+        """
+        Test the in between counts against a scan over all marked cells
+        """
+        for size in [11, 21]:
+            get_geometry(size)
+            positions = np.random.RandomState(size).choice(size ** 2, 3 * size, replace=False)
+            counts = InBetweenCounts(positions, size)
+            points = [Point.from_index(position, size) for position in positions]
+            for source in range(0, size ** 2, 7):
+                destinations = np.arange(size ** 2)
+                for axis in ["x", "y"]:
+                    batched_counts = counts.query(source, destinations, axis)
+                    a = Point.from_index(source, size)
+                    for destination in destinations:
+                        b = Point.from_index(destination, size)
+                        if axis == "x":
+                            line, c1, c2 = a.x, a.y, b.y
+                            marked = [(p.y, p.x == line) for p in points]
+                        else:
+                            line, c1, c2 = a.y, a.x, b.x
+                            marked = [(p.x, p.y == line) for p in points]
+                        distance = dist(c1, c2)
+                        expected = sum(
+                            1 for c, on_line in marked if on_line and dist(c1, c) < distance and dist(c2, c) < distance
+                        )
+                        self.assertEqual(batched_counts[destination], expected)
+                        self.assertEqual(counts.query(source, destination, axis), expected)
+        get_geometry(21)
+
+    def test_step_masks(self):
+        """
+        Test that the sets and masks of the step masks stay in sync
+        """
+        step_masks = StepMasks(21)
+        step_masks.set("planned_moves", [3, 5, 3])
+        step_masks.add("planned_moves", 440)
+        self.assertEqual(step_masks["planned_moves"], {3, 5, 440})
+        self.assertEqual(list(np.nonzero(step_masks.get_mask("planned_moves"))[0]), [3, 5, 440])
+        step_masks.set("planned_moves", [])
+        self.assertFalse(np.any(step_masks.get_mask("planned_moves")))
+        self.assertNotIn(3, step_masks["planned_moves"])
 
 
 if __name__ == '__main__':
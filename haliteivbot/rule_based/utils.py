@@ -1,9 +1,11 @@
+import base64
+import io
 import math
+import os
+import zlib
 
 import numpy as np
-import scipy.optimize
 from kaggle_environments.envs.halite.helpers import Point, Cell, ShipAction
-from scipy.ndimage import gaussian_filter
 
 DIRECTIONS = [ShipAction.NORTH, ShipAction.EAST, ShipAction.SOUTH, ShipAction.WEST]
 NEIGHBOURS = [Point(0, -1), Point(0, 1), Point(-1, 0), Point(1, 0)]
@@ -17,52 +19,157 @@ NEIGHBOURS2 = [
     Point(-1, 1),
     Point(1, -1),
 ]
+# NAVIGATION and FARTHEST_DIRECTIONS_IDX store the directions as bitmasks (west: 1, east: 2, north: 4, south: 8)
+DIRECTION_MASKS = {
+    ShipAction.WEST: 1,
+    ShipAction.EAST: 2,
+    ShipAction.NORTH: 4,
+    ShipAction.SOUTH: 8,
+}
+MASK_TO_DIRECTIONS = [
+    [action for action, bit in DIRECTION_MASKS.items() if mask & bit]
+    for mask in range(16)
+]  # shared lists, don't modify them
+# whether a ship whose farthest directions to a target are the mask f can approach it from direction d
+# (f is d or d plus one orthogonal direction), indexed by [f, index of d in (1, 2, 4, 8)]
+APPROACH_DIRECTIONS = np.array(
+    [[f == d or f - d in (1, 2, 4, 8) for d in (1, 2, 4, 8)] for f in range(16)]
+)
 DISTANCES = None
 NAVIGATION = None
 FARTHEST_DIRECTIONS_IDX = None
-FARTHEST_DIRECTIONS = None
 POSITIONS_IN_REACH = None
 POSITIONS_IN_REACH_INDICES = None
 POSITIONS_IN_TINY_RADIUS = None
 POSITIONS_IN_SMALL_RADIUS = None
 POSITIONS_IN_MEDIUM_RADIUS = None
 SIZE = 21
-TO_INDEX = {Point.from_index(index, SIZE): index for index in range(SIZE ** 2)}
 
 
-def create_optimal_mining_steps_tensor(alpha, beta, gamma):
+class _PointToIndex(dict):
+    """
+    Maps points to their cell index. Entries are created on first access instead of at import time.
+    """
+
+    def __init__(self, size):
+        super().__init__()
+        self.size = size
+
+    def set_size(self, size):
+        if size != self.size:
+            self.clear()
+            self.size = size
+
+    def __missing__(self, point):
+        try:
+            x, y = point
+            valid = 0 <= x < self.size and 0 <= y < self.size
+        except (TypeError, ValueError):
+            valid = False
+        if not valid:
+            raise KeyError(point)
+        index = self[point] = (self.size - y - 1) * self.size + x
+        return index
+
+
+TO_INDEX = _PointToIndex(SIZE)
+
+
+def set_board_size(size):
+    """
+    Make SIZE and TO_INDEX refer to the given board size. TO_INDEX is changed in place,
+    so modules which imported it keep working, but SIZE has to be read from this module.
+    """
+    global SIZE
+    SIZE = size
+    TO_INDEX.set_size(size)
+
+
+MINING_STEPS_TENSOR_SHAPE = (22, 22, 15)
+MINING_STEPS_CACHE_VERSION = 2  # bump when the solver changes
+MINING_STEPS_CACHE_DIR = os.environ.get(
+    "HALITEIVBOT_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "haliteivbot"),
+)
+_MINING_STEPS_TENSORS = dict()
+
+
+def get_mining_steps_tensor_shape(size):
+    # the tensor is indexed by distances, which are at most size - 1 on a torus
+    return (size + 1, size + 1) + MINING_STEPS_TENSOR_SHAPE[2:]
+
+
+def get_optimal_mining_steps_tensor(
+    alpha, beta, gamma, shape=MINING_STEPS_TENSOR_SHAPE
+):
+    """
+    Return the optimal mining steps tensor for the given parameters.
+    Tensors are memoized per process and cached on disk, so the solver only runs
+    once per (alpha, beta, gamma, shape) on each machine.
+    """
+    key = (float(alpha), float(beta), float(gamma), tuple(shape))
+    if key in _MINING_STEPS_TENSORS:
+        return _MINING_STEPS_TENSORS[key]
+    path = os.path.join(
+        MINING_STEPS_CACHE_DIR,
+        "mining_steps_v{}_{!r}_{!r}_{!r}_{}.npy".format(
+            MINING_STEPS_CACHE_VERSION, *key[:3], "x".join(str(dim) for dim in key[3])
+        ),
+    )
+    try:
+        tensor = np.load(path).tolist()
+    except (OSError, ValueError):
+        tensor = create_optimal_mining_steps_tensor(alpha, beta, gamma, shape)
+        try:
+            os.makedirs(MINING_STEPS_CACHE_DIR, exist_ok=True)
+            # write to a temporary file first, other processes might read the cache concurrently
+            tmp_path = "{}.{}.tmp".format(path, os.getpid())
+            with open(tmp_path, "wb") as file:
+                np.save(file, np.array(tensor, dtype=np.uint8))
+            os.replace(tmp_path, path)
+        except OSError:
+            pass  # the disk cache is only an optimization
+    _MINING_STEPS_TENSORS[key] = tensor
+    return tensor
+
+
+def create_optimal_mining_steps_tensor(
+    alpha, beta, gamma, shape=MINING_STEPS_TENSOR_SHAPE
+):
     # The optimal amount of turns spent mining on a cell based on it's distancel, the CHratio and the distance to the nearest friendly shipyard
     # Adapted from https://www.kaggle.com/solverworld/optimal-mining-with-carried-halite
-    chrange = 15
+    # Mining steps are integers, so we evaluate the score for every possible amount of steps at once and take the argmax.
+    n1_range, n2_range, chrange = shape
+    n1 = np.arange(n1_range).reshape((-1, 1, 1, 1))
+    n2 = np.arange(n2_range).reshape((1, -1, 1, 1))
+    ch = np.arange(chrange).reshape((1, 1, -1, 1))
+    m = np.arange(1, 16).reshape((1, 1, 1, -1))
+    CHratio = np.where(ch == 0, 0, np.exp((ch - 5) / 2.5))
+    H = 500
+    C = CHratio * H
+    score = (
+        gamma ** (n1 + m)
+        * (beta * C + (1 - 0.75 ** m) * 1.02 ** (n1 + m) * H)
+        / (n1 + alpha * n2 + m)
+    )
+    return (np.argmax(score, axis=-1) + 1).tolist()
 
-    def score(n1, n2, m, H, C):
-        return (
-            gamma ** (n1 + m)
-            * (beta * C + (1 - 0.75 ** m) * 1.02 ** (n1 + m) * H)
-            / (n1 + alpha * n2 + m)
-        )
 
-    tensor = []
-    for n1 in range(22):
-        n_opt = []
-        for n2 in range(22):
-            ch_opt = []
-            for ch in range(chrange):
-                if ch == 0:
-                    CHratio = 0
-                else:
-                    CHratio = math.exp((ch - 5) / 2.5)
-
-                def h(mine):
-                    return -score(n1, n2, mine, 500, CHratio * 500)
-
-                res = scipy.optimize.minimize_scalar(
-                    h, bounds=(1, 15), method="Bounded"
-                )
-                ch_opt.append(int(round(res.x)))
-            n_opt.append(ch_opt)
-        tensor.append(n_opt)
-    return tensor
+# scipy is slow to import, so it only gets imported on first use
+def linear_sum_assignment(cost_matrix, maximize=False):
+    from scipy.optimize import linear_sum_assignment as scipy_linear_sum_assignment
+
+    return scipy_linear_sum_assignment(cost_matrix, maximize)
+
+
+def capacitated_linear_sum_assignment(cost_matrix, capacities, maximize=False):
+    """
+    Assignment where column j can take up to capacities[j] rows. Every column is repeated once
+    per slot, the returned column indices refer to the original columns.
+    """
+    columns = np.repeat(np.arange(len(capacities)), capacities)
+    row, col = linear_sum_assignment(np.asarray(cost_matrix)[:, columns], maximize)
+    return row, columns[col]
 
 
 def compute_positions_in_reach():
@@ -110,27 +217,155 @@ def get_max_distance(points):
     return max_distance
 
 
-def get_blurred_halite_map(halite, sigma, multiplier=1, size=21):
-    halite_map = np.array(halite).reshape((size, -1))
-    blurred_halite_map = gaussian_filter(halite_map, sigma, mode="wrap")
-    return multiplier * blurred_halite_map.reshape((size ** 2,))
+_BLUR_KERNELS = dict()
+
+
+def _get_blur_kernel(sigma, size):
+    key = (float(sigma), size)
+    if key not in _BLUR_KERNELS:
+        # the same truncated kernel as gaussian_filter, wrapped around the torus
+        radius = int(4.0 * sigma + 0.5)
+        offsets = np.arange(-radius, radius + 1)
+        weights = np.exp(-0.5 / sigma ** 2 * offsets ** 2)
+        kernel = np.zeros((size,))
+        np.add.at(kernel, offsets % size, weights / np.sum(weights))
+        _BLUR_KERNELS[key] = np.outer(np.fft.fft(kernel), np.fft.rfft(kernel))
+    return _BLUR_KERNELS[key]
+
+
+def blur(maps, sigma, size=None):
+    """
+    Blur one map or a stack of maps on the torus. This is a circular convolution, so it is computed
+    in the frequency domain, but the result is the same as gaussian_filter(map, sigma, mode="wrap") for each map.
+    :param maps: a map or a stack of maps, either flat or with shape (..., size, size)
+    :param sigma: a sigma or a sequence of sigmas, which adds a leading axis with one blurred stack per sigma
+    :return: the blurred maps in the shape of the input
+    """
+    size = size or SIZE
+    maps = np.asarray(maps, dtype=np.float)
+    spectrum = np.fft.rfft2(maps.reshape((-1, size, size)))
+    if np.ndim(sigma) == 0:
+        kernels = _get_blur_kernel(sigma, size)
+        shape = maps.shape
+    else:
+        kernels = np.stack([_get_blur_kernel(s, size) for s in sigma])[:, None]
+        shape = (len(sigma),) + maps.shape
+    return np.fft.irfft2(spectrum * kernels, s=(size, size)).reshape(shape)
+
+
+def get_blurred_halite_map(halite, sigma, multiplier=1, size=None):
+    return multiplier * blur(halite, sigma, size)
+
+
+class BoardSnapshot(object):
+    """
+    The ships and shipyards of one step as flat arrays, built once from obs["players"].
+    """
+
+    def __init__(self, players):
+        ship_ids, ship_positions, ship_halite, ship_owners = [], [], [], []
+        shipyard_positions, shipyard_owners = [], []
+        for player_id, (_, shipyards, ships) in enumerate(players):
+            for ship_id, (position, halite) in ships.items():
+                ship_ids.append(ship_id)
+                ship_positions.append(position)
+                ship_halite.append(halite)
+                ship_owners.append(player_id)
+            shipyard_positions.extend(shipyards.values())
+            shipyard_owners.extend([player_id] * len(shipyards))
+        self.player_count = len(players)
+        self.player_halite = np.array([player[0] for player in players], dtype=np.int)
+        self.ship_ids = ship_ids
+        self.ship_positions = np.array(ship_positions, dtype=np.int)
+        self.ship_halite = np.array(ship_halite, dtype=np.int)
+        self.ship_owners = np.array(ship_owners, dtype=np.int)
+        self.shipyard_positions = np.array(shipyard_positions, dtype=np.int)
+        self.shipyard_owners = np.array(shipyard_owners, dtype=np.int)
+
+
+def get_distance_fields(positions, cap=None):
+    """
+    Compute the distance of every cell to the nearest and the second nearest of the given positions.
+    :param positions: the cell indices of e.g. ships or shipyards
+    :param cap: the maximum distance, also used for cells without a (second) nearest position;
+    defaults to the largest distance on the board
+    :return: the nearest distances, the second nearest distances and the index of the nearest position
+    in positions (-1 if there are no positions)
+    """
+    if cap is None:
+        cap = 2 * (SIZE // 2)
+    cell_count = len(DISTANCES)
+    nearest_distances = np.full((cell_count,), fill_value=cap, dtype=np.int)
+    second_nearest_distances = np.full((cell_count,), fill_value=cap, dtype=np.int)
+    nearest_indices = np.full((cell_count,), fill_value=-1, dtype=np.int)
+    if len(positions) == 0:
+        return nearest_distances, second_nearest_distances, nearest_indices
+    distances = DISTANCES[:, positions]
+    nearest_indices = np.argmin(distances, axis=1)
+    np.minimum(
+        distances[np.arange(cell_count), nearest_indices], cap, out=nearest_distances
+    )
+    if len(positions) > 1:
+        np.minimum(
+            np.partition(distances, 1, axis=1)[:, 1],
+            cap,
+            out=second_nearest_distances,
+        )
+    return nearest_distances, second_nearest_distances, nearest_indices
+
+
+DANGER_DISCOUNTS = np.array([1, 0.75, 0.45, 0.15])  # by distance, capped at 3
+
 
+def get_danger_scores(ship_positions, ship_halite, danger_matrix, radius_array):
+    """
+    Rate the danger of the cells in reach of each ship by the enemies in the radius around them.
+    :param danger_matrix: the minimal cargo of the enemy ships that can reach each cell
+    :param radius_array: the cells in the radius around each cell (see Geometry.get_radius_array)
+    :return: the danger scores of the cells in reach of each ship (ships x 5) and the escape matrix (ships x cells),
+    which counts the dangerous cells each cell is adjacent to
+    """
+    ship_count = len(ship_positions)
+    cell_count = len(DISTANCES)
+    reach = POSITIONS_IN_REACH_INDICES[ship_positions]
+    cells = radius_array[reach]
+    discounts = DANGER_DISCOUNTS[np.minimum(DISTANCES[reach[:, :, None], cells], 3)]
+    danger = danger_matrix[cells]
+    cargo = np.reshape(ship_halite, (-1, 1, 1))
+    # 1 for cells with a ship with less cargo, 0.5 for cells with a ship with equal cargo
+    weights = (danger < cargo) + 0.5 * (danger == cargo)
+    # a cumulative sum adds the scores in the same order as a loop would, np.sum might not
+    danger_scores = np.cumsum(2 * discounts * weights, axis=2)[:, :, -1]
+    escape_cells = POSITIONS_IN_REACH_INDICES[cells] + np.reshape(
+        np.arange(ship_count) * cell_count, (-1, 1, 1, 1)
+    )
+    escape_matrix = np.bincount(
+        escape_cells.reshape((-1,)),
+        np.repeat(weights.reshape((-1,)), POSITIONS_IN_REACH_INDICES.shape[1]),
+        minlength=ship_count * cell_count,
+    ).reshape((ship_count, cell_count))
+    return danger_scores, escape_matrix
 
-def get_blurred_conflict_map(me, enemies, alpha, sigma, zeta, size=21):
+
+def get_blurred_conflict_map(snapshot, player_id, alpha, sigma, zeta, size=None):
+    size = size or SIZE
     fight_map = np.full((size, size), fill_value=1, dtype=np.float)
-    max_halite = [
-        max(ship.halite for ship in player.ships) if len(player.ships) > 0 else 0
-        for player in (enemies + [me])
-    ]
-    if len(max_halite) == 0:
+    if snapshot.player_count == 0:
         return
-    max_halite = max(max_halite)
+    max_halite = np.max(snapshot.ship_halite, initial=0)
     if max_halite <= 0:
         return fight_map.reshape((size ** 2,))
-    player_maps = [
-        gaussian_filter(_get_player_map(player, max_halite, size), sigma, mode="wrap")
-        for player in [me] + enemies
+    player_ids = [player_id] + [
+        other_id for other_id in range(snapshot.player_count) if other_id != player_id
     ]
+    player_maps = blur(
+        [
+            _get_player_map(snapshot, other_id, max_halite, size)
+            for other_id in player_ids
+        ],
+        sigma,
+        size,
+    )
     max_value = max([np.max(player_map) for player_map in player_maps])
     for player_index, player_map in enumerate(player_maps):
         player_map = (player_map / max_value) * zeta + 1
@@ -140,86 +375,273 @@ def get_blurred_conflict_map(me, enemies, alpha, sigma, zeta, size=21):
     return fight_map.reshape((size ** 2,))
 
 
-def _get_player_map(player, max_halite, size=21):
-    player_map = np.ndarray((size ** 2,), dtype=np.float)
-    for ship in player.ships:
-        player_map[TO_INDEX[ship.position]] = ship.halite / max_halite
-    for shipyard in player.shipyards:
-        player_map[TO_INDEX[shipyard.position]] = max_halite / 2
+def _get_player_map(snapshot, player_id, max_halite, size=None):
+    size = size or SIZE
+    player_map = np.zeros((size ** 2,), dtype=np.float)
+    ships = snapshot.ship_owners == player_id
+    player_map[snapshot.ship_positions[ships]] = (
+        snapshot.ship_halite[ships] / max_halite
+    )
+    player_map[snapshot.shipyard_positions[snapshot.shipyard_owners == player_id]] = (
+        max_halite / 2
+    )
     return player_map.reshape((size, size))
 
 
-def get_cargo_map(ships, shipyards, halite_norm, size=21):
+def get_cargo_map(snapshot, player_id, halite_norm, size=None):
+    size = size or SIZE
     cargo_map = np.zeros((size ** 2,), dtype=np.float)
-    for ship in ships:
-        cargo_map[TO_INDEX[ship.position]] += ship.halite / halite_norm
-    for shipyard in shipyards:
-        cargo_map[TO_INDEX[shipyard.position]] += 700 / halite_norm
-    return 30 * gaussian_filter(
-        cargo_map.reshape((SIZE, SIZE)), sigma=2.5, mode="wrap"
-    ).reshape((-1,))
-
-
-def get_hunting_matrix(ships):
-    hunting_matrix = np.full(shape=(SIZE ** 2,), fill_value=99999, dtype=np.int)
-    for ship in ships:
-        for position in POSITIONS_IN_REACH_INDICES[TO_INDEX[ship.position]]:
-            if hunting_matrix[position] > ship.halite:
-                hunting_matrix[position] = ship.halite
-    return hunting_matrix
-
-
-def get_dominance_map(me, opponents, sigma, factor, halite_clip, size=21):
-    dominance_map = np.zeros((SIZE ** 2), dtype=np.float)
-    for ship in me.ships:
-        dominance_map[TO_INDEX[ship.position]] += (
-            clip(halite_clip - ship.halite, 0, halite_clip) / halite_clip
+    ships = snapshot.ship_owners == player_id
+    np.add.at(
+        cargo_map,
+        snapshot.ship_positions[ships],
+        snapshot.ship_halite[ships] / halite_norm,
+    )
+    np.add.at(
+        cargo_map,
+        snapshot.shipyard_positions[snapshot.shipyard_owners == player_id],
+        700 / halite_norm,
+    )
+    return 30 * blur(cargo_map, 2.5, size)
+
+
+def min_filter(map, radius, size=None):
+    """
+    Replace each cell of a flat map with the minimum of all cells within the given distance on the torus.
+    """
+    size = size or SIZE
+    filtered_map = np.reshape(map, (size, size))
+    for _ in range(radius):
+        # a diamond of radius r is a cross applied r times
+        filtered_map = np.minimum.reduce(
+            [
+                filtered_map,
+                np.roll(filtered_map, 1, axis=0),
+                np.roll(filtered_map, -1, axis=0),
+                np.roll(filtered_map, 1, axis=1),
+                np.roll(filtered_map, -1, axis=1),
+            ]
+        )
+    return filtered_map.reshape((size ** 2,))
+
+
+def get_hunting_matrix(ship_positions, ship_halite, size=None):
+    """
+    Compute the minimal cargo of all given ships that can reach each cell (99999 if no ship can reach a cell).
+    """
+    size = size or SIZE
+    cargo_map = np.full(shape=(size ** 2,), fill_value=99999, dtype=np.int)
+    np.minimum.at(cargo_map, ship_positions, ship_halite)
+    return min_filter(cargo_map, 1, size)
+
+
+def get_danger_fields(ship_positions, ship_halite, tiny_radius=2, size=None):
+    """
+    :return: the hunting matrix of the given ships and the minimum of the hunting matrix within the tiny radius
+    """
+    hunting_matrix = get_hunting_matrix(ship_positions, ship_halite, size)
+    return hunting_matrix, min_filter(hunting_matrix, tiny_radius, size)
+
+
+class DominanceFields(object):
+    """
+    The dominance maps of one step. The influence layers of all players are built once and blurred
+    for all sigmas in a single batch; the resulting maps are cached.
+    """
+
+    def __init__(self, snapshot, player_id, halite_clip, sigmas, size=None):
+        self.size = size or SIZE
+        self.sigmas = tuple(sigmas)
+        ship_dominance = (
+            np.clip(halite_clip - snapshot.ship_halite, 0, halite_clip) / halite_clip
+        )
+        # one layer per player and the safety layer (our influence minus the influence of our opponents)
+        layers = np.zeros((5, self.size ** 2), dtype=np.float)
+        np.add.at(
+            layers, (snapshot.ship_owners, snapshot.ship_positions), ship_dominance
+        )
+        np.add.at(layers, (snapshot.shipyard_owners, snapshot.shipyard_positions), 1.5)
+        np.add.at(
+            layers[4],
+            snapshot.ship_positions,
+            np.where(
+                snapshot.ship_owners == player_id, ship_dominance, -ship_dominance
+            ),
         )
-    for shipyard in me.shipyards:
-        dominance_map[TO_INDEX[shipyard.position]] += 1.5
-    for player in opponents:
-        for ship in player.ships:
-            dominance_map[TO_INDEX[ship.position]] -= (
-                clip(halite_clip - ship.halite, 0, halite_clip) / halite_clip
+        np.add.at(
+            layers[4],
+            snapshot.shipyard_positions,
+            np.where(snapshot.shipyard_owners == player_id, 1.5, -1.8),
+        )
+        self.blurred_layers = blur(layers, self.sigmas, self.size)
+        self.cache = dict()
+
+    def _get_blurred_layers(self, sigma):
+        return self.blurred_layers[self.sigmas.index(sigma)]
+
+    def get_dominance_map(self, sigma, factor):
+        """
+        :return: the dominance of each player over the strongest other player (players x cells)
+        """
+        key = ("dominance", sigma, factor)
+        if key not in self.cache:
+            dominance_regions = factor * self._get_blurred_layers(sigma)[:4]
+            # the maximum over all other players is the second largest value for the strongest player
+            # and the largest value for everyone else
+            strongest = np.argmax(dominance_regions, axis=0)
+            top_two = -np.partition(-dominance_regions, 1, axis=0)[:2]
+            maxima = np.where(
+                np.arange(4)[:, None] == strongest, top_two[1], top_two[0]
             )
-        for shipyard in player.shipyards:
-            dominance_map[TO_INDEX[shipyard.position]] -= 1.8
-    blurred_dominance_map = gaussian_filter(
-        dominance_map.reshape((size, size)), sigma=sigma, mode="wrap"
+            self.cache[key] = dominance_regions - maxima
+        return self.cache[key]
+
+    def get_regions(self, sigma, threshold=0.1):
+        key = ("regions", sigma, threshold)
+        if key not in self.cache:
+            dominance_map = self.get_dominance_map(sigma, 50)
+            regions = np.full((self.size ** 2,), fill_value=-1, dtype=np.int)
+            for i in range(4):
+                regions[dominance_map[i] >= threshold] = i
+            self.cache[key] = regions
+        return self.cache[key]
+
+    def get_safety_map(self, sigma, factor):
+        key = ("safety", sigma, factor)
+        if key not in self.cache:
+            self.cache[key] = factor * self._get_blurred_layers(sigma)[4]
+        return self.cache[key]
+
+
+def get_dominance_map(snapshot, player_id, sigma, factor, halite_clip, size=None):
+    return DominanceFields(
+        snapshot, player_id, halite_clip, [sigma], size
+    ).get_safety_map(sigma, factor)
+
+
+def get_new_dominance_map(snapshot, sigma, factor, halite_clip, size=None):
+    return DominanceFields(snapshot, -1, halite_clip, [sigma], size).get_dominance_map(
+        sigma, factor
     )
-    return factor * blurred_dominance_map.reshape((-1,))
 
 
-def get_new_dominance_map(players, sigma, factor, halite_clip, size=21):
-    dominance_regions = np.zeros((4, size ** 2), dtype=np.float)
-    for player in players:
-        player_id = player.id
-        dominance_map = np.zeros((size ** 2,), dtype=np.float)
-        for ship in player.ships:
-            dominance_map[TO_INDEX[ship.position]] = (
-                clip(halite_clip - ship.halite, 0, halite_clip) / halite_clip
-            )
-        for shipyard in player.shipyards:
-            dominance_map[TO_INDEX[shipyard.position]] += 1.5
-        dominance_regions[player_id] = factor * gaussian_filter(
-            dominance_map.reshape((size, size)), sigma=sigma, mode="wrap"
-        ).reshape((-1,))
-
-    maxima = np.zeros((4, size ** 2))
-    for i in range(4):
-        maxima[i] = np.max(
-            dominance_regions[[j for j in range(4) if j != i], :], axis=0
-        )
-    dominance_regions -= maxima
-    return dominance_regions
+def get_regions(snapshot, sigma, halite_clip, threshold=0.1, size=None):
+    return DominanceFields(snapshot, -1, halite_clip, [sigma], size).get_regions(
+        sigma, threshold
+    )
+
+
+class StepMasks(object):
+    """
+    Sets and boolean masks of the position categories of a step (farming positions, planned moves, ...)
+    for constant time membership tests and vectorized lookups.
+    """
+
+    def __init__(self, size=None):
+        self.size = size or SIZE
+        self.sets = dict()
+        self.masks = dict()
+
+    def set(self, category, positions):
+        self.sets[category] = set(positions)
+        mask = np.zeros(self.size ** 2, dtype=np.bool)
+        mask[list(self.sets[category])] = True
+        self.masks[category] = mask
 
+    def add(self, category, position):
+        self.sets[category].add(position)
+        self.masks[category][position] = True
 
-def get_regions(players, sigma, halite_clip, threshold=0.1, size=21):
-    dominance_map = get_new_dominance_map(players, sigma, 50, halite_clip, size)
-    regions = np.full((SIZE ** 2,), fill_value=-1, dtype=np.int)
-    for i in range(4):
-        regions[dominance_map[i] >= threshold] = i
-    return regions
+    def __getitem__(self, category):
+        return self.sets[category]
+
+    def get_mask(self, category):
+        return self.masks[category]
+
+
+class FeatureMaps(object):
+    """
+    Registry of the feature maps of a step. Every map is registered with the function computing it
+    from its dependencies and is only computed on its first access within a step.
+    """
+
+    def __init__(self):
+        self.providers = dict()
+        self.maps = dict()
+        self.computations = dict()  # the number of steps in which each map was computed
+        self.steps = 0
+        self._computing = set()
+
+    def register(self, name, provider, dependencies=()):
+        self.providers[name] = (provider, tuple(dependencies))
+        self.computations.setdefault(name, 0)
+
+    def reset(self):
+        self.maps.clear()
+        self.steps += 1
+
+    def set(self, name, value):
+        """
+        Set a map which the step computes itself (it has no provider). Cached maps which depend on
+        it are dropped.
+        """
+        self.maps[name] = value
+        self._invalidate(name)
+
+    def _invalidate(self, name):
+        for other, (_, dependencies) in self.providers.items():
+            if name in dependencies and other in self.maps:
+                del self.maps[other]
+                self._invalidate(other)
+
+    def __getitem__(self, name):
+        if name not in self.maps:
+            if name not in self.providers:
+                raise KeyError(
+                    "The feature map " + name + " hasn't been set in this step"
+                )
+            if name in self._computing:
+                raise ValueError("Cyclic dependency of the feature map " + name)
+            provider, dependencies = self.providers[name]
+            self._computing.add(name)
+            try:
+                self.maps[name] = provider(
+                    *[self[dependency] for dependency in dependencies]
+                )
+            finally:
+                self._computing.discard(name)
+            self.computations[name] += 1
+        return self.maps[name]
+
+    def get_usage(self):
+        """
+        :return: the share of steps in which each registered map was computed
+        """
+        return {
+            name: computations / max(self.steps, 1)
+            for name, computations in self.computations.items()
+        }
+
+
+class FeatureMap(object):
+    """
+    Exposes a map of the feature_maps registry of the owner as a read-only attribute.
+    """
+
+    def __init__(self, name=None):
+        self.name = name
+
+    def __set_name__(self, owner, name):
+        if self.name is None:
+            self.name = name
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        return instance.feature_maps[self.name]
+
+    def __set__(self, instance, value):
+        raise AttributeError("Feature maps are computed by the feature_maps registry")
 
 
 def get_borders(positions):
@@ -238,31 +660,13 @@ def create_navigation_lists(size):
     idx1 = np.repeat(base, size ** 2)
     idx2 = np.tile(base, size ** 2)
 
-    idx_to_action = {
-        0: None,
-        1: ShipAction.WEST,
-        2: ShipAction.EAST,
-        4: ShipAction.NORTH,
-        8: ShipAction.SOUTH,
-    }
-
-    idx_to_action_list = dict()
-    for int_a, action_a in [(i, idx_to_action[i]) for i in range(3)]:
-        for int_b, action_b in [(j, idx_to_action[j]) for j in (0, 4, 8)]:
-            action_list = []
-            if action_a is not None:
-                action_list.append(action_a)
-            if action_b is not None:
-                action_list.append(action_b)
-            idx_to_action_list[int_a + int_b] = action_list
-
     def calculate(a1, a2, smaller_val, greater_val):
         amin = np.fmin(a1, a2)
         amax = np.fmax(a1, a2)
         adiff = amax - amin
         adist = np.fmin(adiff, size - adiff)
         wrap_around = np.not_equal(adiff, adist)
-        directions = np.zeros((len(a1),), dtype=np.int)
+        directions = np.zeros((len(a1),), dtype=np.uint8)
         greater = np.greater(a2, a1)
         smaller = np.greater(a1, a2)
         directions[greater != wrap_around] = greater_val
@@ -283,9 +687,9 @@ def create_navigation_lists(size):
     DISTANCES = dist_matrix
 
     global NAVIGATION
-    NAVIGATION = [[idx_to_action_list[a] for a in b] for b in dir_matrix]
+    NAVIGATION = dir_matrix
 
-    farthest_directions = np.zeros((size ** 4), dtype=np.int)
+    farthest_directions = np.zeros((size ** 4), dtype=np.uint8)
     farthest_directions[coldist < rowdist] += direction_x[coldist < rowdist]
     farthest_directions[coldist > rowdist] += direction_y[coldist > rowdist]
     farthest_directions[coldist == rowdist] += (
@@ -295,11 +699,6 @@ def create_navigation_lists(size):
     global FARTHEST_DIRECTIONS_IDX
     FARTHEST_DIRECTIONS_IDX = farthest_directions.reshape((size ** 2, size ** 2))
 
-    global FARTHEST_DIRECTIONS
-    FARTHEST_DIRECTIONS = [
-        [idx_to_action_list[a] for a in b] for b in FARTHEST_DIRECTIONS_IDX
-    ]
-
 
 def dist(a, b):
     diff = abs(a - b)
@@ -313,6 +712,62 @@ def get_axis(direction):
         return "x"
 
 
+_BETWEEN_MASKS = dict()
+
+
+def _get_between_mask(size):
+    """
+    :return: between[a, b, c] is True if dist(a, c) and dist(b, c) are both smaller than dist(a, b)
+    """
+    if size not in _BETWEEN_MASKS:
+        coordinates = np.arange(size)
+        differences = np.abs(coordinates[:, None] - coordinates[None, :])
+        distances = np.minimum(differences, size - differences)
+        mask = (distances[:, None, :] < distances[:, :, None]) & (
+            distances[None, :, :] < distances[:, :, None]
+        )
+        mask.setflags(write=False)
+        _BETWEEN_MASKS[size] = mask
+    return _BETWEEN_MASKS[size]
+
+
+class InBetweenCounts(object):
+    """
+    Counts the marked cells between two points along one axis in constant time.
+    Like dist(), "between" means closer to both points than they are to each other, which also
+    includes cells on the long way around the board if the points are far apart.
+    """
+
+    def __init__(self, positions, size=None):
+        self.size = size = size or SIZE
+        cells = np.zeros((size, size), dtype=np.int)  # x, y
+        positions = np.asarray(positions, dtype=np.int)
+        cells[positions % size, size - 1 - positions // size] = 1
+        between = _get_between_mask(size).astype(np.int)
+        # counts[0][x, y1, y2]: cells in column x between the rows y1 and y2
+        # counts[1][y, x1, x2]: cells in row y between the columns x1 and x2
+        self.counts = np.stack(
+            [
+                np.einsum("xc,abc->xab", cells, between),
+                np.einsum("cy,abc->yab", cells, between),
+            ]
+        )
+
+    def query(self, sources, destinations, axis):
+        """
+        :param sources: position indices (scalars or arrays)
+        :param destinations: position indices (scalars or arrays)
+        :param axis: "x" to count in the column of the source, anything else to count in its row
+        """
+        size = self.size
+        source_x, source_y = sources % size, size - 1 - sources // size
+        destination_x = destinations % size
+        destination_y = size - 1 - destinations // size
+        if axis == "x":
+            return self.counts[0, source_x, source_y, destination_y]
+        return self.counts[1, source_y, source_x, destination_x]
+
+
 def get_triangles(positions, min_distance, max_distance):
     triangles = []
     if len(positions) < 3:
@@ -366,6 +821,136 @@ def create_radius_list(radius):
     return radius_list
 
 
+class Geometry(object):
+    """
+    The navigation, reach and radius tables of a torus with the given size.
+    Geometries are shared by all bots of a process (see get_geometry) and must be treated as read-only.
+    """
+
+    def __init__(self, size, tables=None):
+        self.size = size
+        if tables is None:
+            set_board_size(size)
+            create_navigation_lists(size)
+            compute_positions_in_reach()
+            self.distances = DISTANCES
+            self.navigation = NAVIGATION
+            self.farthest_directions_idx = FARTHEST_DIRECTIONS_IDX
+            self.positions_in_reach = POSITIONS_IN_REACH
+            self.positions_in_reach_indices = POSITIONS_IN_REACH_INDICES
+        else:
+            # precomputed tables, e.g. from a geometry blob
+            for name in GEOMETRY_TABLES:
+                setattr(self, name, tables[name])
+            self.positions_in_reach = {
+                Point.from_index(pos, size): tuple(
+                    Point.from_index(reachable_pos, size) for reachable_pos in row
+                )
+                for pos, row in enumerate(self.positions_in_reach_indices.tolist())
+            }
+        for array in (
+            self.distances,
+            self.navigation,
+            self.farthest_directions_idx,
+            self.positions_in_reach_indices,
+        ):
+            array.setflags(write=False)
+        self.radius_lists = dict()
+        self.radius_arrays = dict()
+
+    def install(self):
+        # the module level helpers (nav, get_distance, ...) work on the globals
+        global DISTANCES, NAVIGATION, FARTHEST_DIRECTIONS_IDX
+        global POSITIONS_IN_REACH, POSITIONS_IN_REACH_INDICES
+        set_board_size(self.size)
+        DISTANCES = self.distances
+        NAVIGATION = self.navigation
+        FARTHEST_DIRECTIONS_IDX = self.farthest_directions_idx
+        POSITIONS_IN_REACH = self.positions_in_reach
+        POSITIONS_IN_REACH_INDICES = self.positions_in_reach_indices
+
+    def get_radius_list(self, radius):
+        if radius not in self.radius_lists:
+            self.install()
+            self.radius_lists[radius] = create_radius_list(radius)
+        return self.radius_lists[radius]
+
+    def get_radius_array(self, radius):
+        # all cells of a torus have the same number of cells in their radius
+        if radius not in self.radius_arrays:
+            radius_array = np.array(self.get_radius_list(radius), dtype=np.int)
+            radius_array.setflags(write=False)
+            self.radius_arrays[radius] = radius_array
+        return self.radius_arrays[radius]
+
+
+GEOMETRY_TABLES = (
+    "distances",
+    "navigation",
+    "farthest_directions_idx",
+    "positions_in_reach_indices",
+)
+_GEOMETRIES = dict()
+
+
+def get_geometry(size=None, radii=()):
+    """
+    Return the geometry of the given board size with the radius lists for all given radii.
+    Geometries are built lazily once per process and board size; worker processes forked afterwards inherit them.
+    The returned geometry gets installed, i.e. the module level helpers work on its board size.
+    """
+    size = size or SIZE
+    geometry = _GEOMETRIES.get(size)
+    if geometry is None:
+        geometry = _GEOMETRIES[size] = Geometry(size)
+    geometry.install()
+    for radius in radii:
+        geometry.get_radius_list(radius)
+    return geometry
+
+
+def dump_geometry_blob(geometry, optimal_mining_steps):
+    """
+    Serialize the tables of a geometry and a mining steps tensor into a base64 encoded, compressed npz blob.
+    """
+    arrays = {
+        "size": np.array(geometry.size),
+        "distances": geometry.distances.astype(np.uint8),
+        "navigation": geometry.navigation,
+        "farthest_directions_idx": geometry.farthest_directions_idx,
+        "positions_in_reach_indices": geometry.positions_in_reach_indices.astype(
+            np.uint16
+        ),
+        "optimal_mining_steps": np.array(optimal_mining_steps, dtype=np.uint8),
+    }
+    for radius, radius_list in geometry.radius_lists.items():
+        # all cells of a torus have the same number of cells in their radius
+        arrays["radius_{}".format(radius)] = np.array(radius_list, dtype=np.uint16)
+    buffer = io.BytesIO()
+    np.savez(buffer, **arrays)
+    return base64.b64encode(zlib.compress(buffer.getvalue(), 9)).decode("ascii")
+
+
+def load_geometry_blob(blob):
+    """
+    Load a blob created by dump_geometry_blob and register its geometry for get_geometry.
+    :return: the geometry and the optimal mining steps tensor
+    """
+    arrays = np.load(io.BytesIO(zlib.decompress(base64.b64decode(blob))))
+    size = int(arrays["size"])
+    tables = {name: arrays[name] for name in GEOMETRY_TABLES}
+    tables["distances"] = tables["distances"].astype(np.int)
+    tables["positions_in_reach_indices"] = tables["positions_in_reach_indices"].astype(
+        np.int
+    )
+    geometry = _GEOMETRIES[size] = Geometry(size, tables)
+    for name in arrays.files:
+        if name.startswith("radius_"):
+            geometry.radius_lists[int(name[7:])] = arrays[name].tolist()
+    geometry.install()
+    return geometry, arrays["optimal_mining_steps"].tolist()
+
+
 def group_ships(ships, max_group_size, max_distance):
     position_to_ship = {TO_INDEX[ship.position]: ship for ship in ships}
     groups = group_positions(
@@ -431,11 +1016,11 @@ def group_positions(positions, max_group_size, max_distance):
 
 
 def navigate(source: Point, target: Point, size: int):
-    return NAVIGATION[TO_INDEX[source]][TO_INDEX[target]]
+    return MASK_TO_DIRECTIONS[NAVIGATION[TO_INDEX[source], TO_INDEX[target]]]
 
 
 def nav(source: int, target: int):
-    return NAVIGATION[source][target]
+    return MASK_TO_DIRECTIONS[NAVIGATION[source, target]]
 
 
 def get_inefficient_directions(directions):
@@ -443,7 +1028,7 @@ def get_inefficient_directions(directions):
 
 
 def get_direction_to_neighbour(source: int, target: int) -> ShipAction:
-    return NAVIGATION[source][target][0]
+    return MASK_TO_DIRECTIONS[NAVIGATION[source, target]][0]
 
 
 def calculate_distance(source: Point, target: Point):
@@ -468,8 +1053,8 @@ def get_farthest_directions_matrix():
     return FARTHEST_DIRECTIONS_IDX
 
 
-def get_farthest_directions_list():
-    return FARTHEST_DIRECTIONS
+def get_farthest_directions(source: int, target: int):
+    return MASK_TO_DIRECTIONS[FARTHEST_DIRECTIONS_IDX[source, target]]
 
 
 def get_neighbours(cell: Cell):
@@ -576,6 +1161,18 @@ def get_orthogonal_vector(v: Vector):
     return Vector(-v.y, v.x)
 
 
+def fix_near_integers(values, function, *arguments, tolerance=1e-9):
+    """
+    Recompute the values that lie close to an integer with the scalar function. Vectorized functions like
+    np.log may differ from their math counterparts in the last bit, which changes the result of int() or
+    ceil() right at the integer boundaries.
+    """
+    arguments = np.broadcast_arrays(*arguments)
+    for index in zip(*np.nonzero(np.abs(values - np.round(values)) < tolerance)):
+        values[index] = function(*[float(argument[index]) for argument in arguments])
+    return values
+
+
 def clip(a, minimum, maximum):
     if a <= minimum:
         return minimum